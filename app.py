@@ -12,35 +12,834 @@ python app.py
 Dann öffne: http://localhost:8888
 """
 
-from flask import Flask, render_template_string, request, send_file, jsonify
+from flask import Flask, Response, request, send_file, jsonify, url_for, abort
+from werkzeug.wsgi import ClosingIterator
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import cm
-from reportlab.pdfgen import canvas
-from reportlab.pdfbase.pdfmetrics import stringWidth
-from datetime import date
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from itertools import accumulate
+from datetime import date, datetime
 import os
 import io
-import base64
-import config
+import re
+import sys
+import csv
+import json
+import zipfile
+import shutil
+import tempfile
+import sqlite3
+import uuid
+import argparse
+import copy
+import atexit
+import threading
+import concurrent.futures
+import multiprocessing
+import hashlib
+import bisect
+import math
+import zlib
+import time
+import functools
+import runpy
+import types
 from pathlib import Path
 
+# reportlab.pdfgen, pdfmetrics und PIL werden erst beim ersten Brief geladen
+# (Importe in den Funktionen), damit CLI-Aufrufe und Worker schnell starten.
+
+try:
+    import config
+except ModuleNotFoundError as e:
+    if e.name != 'config':
+        raise
+    # Ohne config.py mit den Beispielwerten weitermachen statt abzubrechen
+    import importlib.util
+    _spec = importlib.util.spec_from_file_location('config', Path(__file__).with_name('config.example.py'))
+    config = importlib.util.module_from_spec(_spec)
+    _spec.loader.exec_module(config)
+    sys.modules['config'] = config
+    print("⚠️  config.py fehlt – verwende config.example.py (siehe README)", file=sys.stderr)
+
 app = Flask(__name__)
 
 BASE_DIR = Path(__file__).parent
 STATIC_DIR = BASE_DIR / config.ORDNER_STATIC
-WAPPEN_FARBE = STATIC_DIR / config.DATEI_WAPPEN_FARBE
-WAPPEN_SW = STATIC_DIR / config.DATEI_WAPPEN_SW
 
-ABSENDER_STRASSE = config.STRASSE
-ABSENDER_PLZ_ORT = f"{config.PLZ} {config.ORT}"
+# Mandanten: weitere Briefköpfe als <name>.py im Format von config.py
+# (None = nur config.py als Mandant "standard")
+MANDANTEN_ORDNER = getattr(config, 'MANDANTEN_ORDNER', None)
+MANDANTEN_CACHE = getattr(config, 'MANDANTEN_CACHE', 256)
+MUSTER_ORDNER = getattr(config, 'MUSTER_ORDNER', None)               # Briefmuster mit {{platzhaltern}}
+
+# Obergrenzen der prozessweiten Caches (Einträge, älteste fliegen zuerst)
+BILD_CACHE_EINTRAEGE = getattr(config, 'BILD_CACHE_EINTRAEGE', 128)
+VORLAGEN_CACHE_EINTRAEGE = getattr(config, 'VORLAGEN_CACHE_EINTRAEGE', 512)
+ABSATZ_CACHE_EINTRAEGE = getattr(config, 'ABSATZ_CACHE_EINTRAEGE', 4096)
+ABSATZ_CACHE_ZEICHEN = getattr(config, 'ABSATZ_CACHE_ZEICHEN', 2_000_000)   # Absatz- plus Zeilentext
+
+# Schriften: TrueType-Dateien statt der Standardschriften Helvetica/Helvetica-Bold,
+# die nur WinAnsi abdecken (z.B. für polnische oder türkische Buchstaben)
+TTF_SCHRIFT = getattr(config, 'TTF_SCHRIFT', None)
+TTF_SCHRIFT_FETT = getattr(config, 'TTF_SCHRIFT_FETT', None)
+SCHRIFT = 'BriefSchrift' if TTF_SCHRIFT else 'Helvetica'
+SCHRIFT_FETT = ('BriefSchrift-Fett' if TTF_SCHRIFT_FETT else SCHRIFT) if TTF_SCHRIFT else 'Helvetica-Bold'
+
+# Brieftext standardmäßig im Blocksatz statt linksbündig setzen
+BLOCKSATZ = getattr(config, 'BLOCKSATZ', False)
+
+# PDF-Ausgabe: "archiv" (volle Qualität) oder "email" (kleine Dateien)
+AUSGABE_PROFIL = getattr(config, 'AUSGABE_PROFIL', 'archiv')
+EMAIL_BILD_DPI = getattr(config, 'EMAIL_BILD_DPI', 200)
+EMAIL_SEITEN_KOMPRESSION = getattr(config, 'EMAIL_SEITEN_KOMPRESSION', True)
+
+# Zugangskontrolle für /generate, /generate/batch und /jobs
+ANFRAGE_MAX_BYTES = getattr(config, 'ANFRAGE_MAX_BYTES', 2 * 1024 * 1024)
+BRIEFTEXT_MAX_ZEICHEN = getattr(config, 'BRIEFTEXT_MAX_ZEICHEN', 500_000)
+ANFRAGE_MAX_SEITEN = getattr(config, 'ANFRAGE_MAX_SEITEN', 100)        # geschätzt, über alle Briefe einer Anfrage
+RATE_LIMIT_PRO_MINUTE = getattr(config, 'RATE_LIMIT_PRO_MINUTE', 60)   # 0 = aus
+RATE_LIMIT_BURST = getattr(config, 'RATE_LIMIT_BURST', 20)
+VORSCHAU_PRO_MINUTE = getattr(config, 'VORSCHAU_PRO_MINUTE', 600)     # /preview, eigener Eimer; 0 = aus
+RENDER_GLEICHZEITIG = getattr(config, 'RENDER_GLEICHZEITIG', 4)        # pro Prozess, 0 = unbegrenzt
+RENDER_PLATZ_WARTEZEIT = getattr(config, 'RENDER_PLATZ_WARTEZEIT', 2)
+VERTRAUTE_PROXYS = getattr(config, 'VERTRAUTE_PROXYS', 0)
+
+# Bilder, Vorlagen und Wortbreiten beim Serverstart vorbereiten
+VORWAERMEN = getattr(config, 'VORWAERMEN', True)
+
+WORTBREITEN_CACHE_GROESSE = 20000
+WORTBREITEN_CACHE_ZEICHEN = 500_000
+
+# Render-Pool: 0 Worker = im Request-Prozess rendern (Standard)
+RENDER_POOL_WORKER = getattr(config, 'RENDER_POOL_WORKER', 0)
+RENDER_POOL_WARTESCHLANGE = getattr(config, 'RENDER_POOL_WARTESCHLANGE', 32)
+RENDER_POOL_TIMEOUT = getattr(config, 'RENDER_POOL_TIMEOUT', 60)
+SEITEN_PARALLEL_AB = getattr(config, 'SEITEN_PARALLEL_AB', 0)          # Seiten, ab denen ein Brief auf die Worker verteilt wird; 0 = aus
+
+# Größere Ausgaben (Serienbriefe) ab dieser Größe in eine temporäre Datei auslagern
+STREAM_SPEICHER_GRENZE = getattr(config, 'STREAM_SPEICHER_GRENZE', 8 * 1024 * 1024)
+
+# Ergebnis-Cache für wiederholte /generate-Anfragen
+ERGEBNIS_CACHE_BYTES = getattr(config, 'ERGEBNIS_CACHE_BYTES', 64 * 1024 * 1024)
+ERGEBNIS_CACHE_ORDNER = getattr(config, 'ERGEBNIS_CACHE_ORDNER', None)
+
+# Auftrags-Warteschlange (/jobs) für lange Briefe und Serienbriefe
+JOB_DATENBANK = str(BASE_DIR / getattr(config, 'JOB_DATENBANK', 'auftraege.sqlite3'))
+JOB_WORKER = getattr(config, 'JOB_WORKER', 2)
+JOB_WARTESCHLANGE = getattr(config, 'JOB_WARTESCHLANGE', 100)
+JOB_TTL = getattr(config, 'JOB_TTL', 3600)
+JOB_LAUFZEIT_MAX = getattr(config, 'JOB_LAUFZEIT_MAX', 600)
+
+# Archiv erstellter Briefe mit Volltextsuche (/archive); None = aus
+ARCHIV_DATENBANK = getattr(config, 'ARCHIV_DATENBANK', None)
+
+# Messwerte für /metrics (Prometheus-Textformat). Mit Render-Pool werden die
+# Werte im Worker aufgezeichnet und im Hauptprozess eingetragen.
+# Mit METRIK_ORDNER legt jeder Prozess (z.B. jeder gunicorn-Worker) seine Werte
+# dort in einer eigenen Datei ab und /metrics zählt alle Dateien zusammen.
+# Ohne Ordner zeigt /metrics nur den Prozess, der die Anfrage bearbeitet.
+METRIK_ORDNER = getattr(config, 'METRIK_ORDNER', None)
+ZEIT_GRENZEN = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SEITEN_GRENZEN = (1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+BYTE_GRENZEN = (16e3, 32e3, 64e3, 128e3, 256e3, 512e3, 1e6, 2e6, 5e6, 10e6, 50e6)
+
+def _label_text(labels, extra=()):
+    paare = list(labels) + list(extra)
+    if not paare:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in paare) + "}"
+
+def _zahl(wert):
+    return repr(float(wert)) if isinstance(wert, float) else str(wert)
+
+class Histogramm:
+    def __init__(self, name, hilfe, grenzen):
+        self.name = name
+        self.hilfe = hilfe
+        self.grenzen = grenzen
+        self.werte = {}
+        self.lock = threading.Lock()
+
+    def beobachten(self, wert, **labels):
+        schluessel = tuple(sorted(labels.items()))
+        with self.lock:
+            eintrag = self.werte.get(schluessel)
+            if eintrag is None:
+                eintrag = self.werte[schluessel] = [[0] * len(self.grenzen), 0.0, 0]
+            for i, grenze in enumerate(self.grenzen):
+                if wert <= grenze:
+                    eintrag[0][i] += 1
+            eintrag[1] += wert
+            eintrag[2] += 1
+
+    def stand(self):
+        with self.lock:
+            return [[labels, [list(eimer), summe, anzahl]] for labels, (eimer, summe, anzahl) in self.werte.items()]
+
+    def addieren(self, werte, stand):
+        for labels, (eimer, summe, anzahl) in stand:
+            schluessel = tuple(map(tuple, labels))
+            eintrag = werte.get(schluessel)
+            if eintrag is None:
+                eintrag = werte[schluessel] = [[0] * len(self.grenzen), 0.0, 0]
+            eintrag[0] = [a + b for a, b in zip(eintrag[0], eimer)]
+            eintrag[1] += summe
+            eintrag[2] += anzahl
+
+    def ausgabe(self, werte=None):
+        zeilen = [f"# HELP {self.name} {self.hilfe}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for labels, (eimer, summe, anzahl) in sorted((self.werte if werte is None else werte).items()):
+                for grenze, zaehler in zip(self.grenzen, eimer):
+                    zeilen.append(f"{self.name}_bucket{_label_text(labels, [('le', _zahl(grenze))])} {zaehler}")
+                zeilen.append(f"{self.name}_bucket{_label_text(labels, [('le', '+Inf')])} {anzahl}")
+                zeilen.append(f"{self.name}_sum{_label_text(labels)} {_zahl(summe)}")
+                zeilen.append(f"{self.name}_count{_label_text(labels)} {anzahl}")
+        return zeilen
+
+class Zaehler:
+    def __init__(self, name, hilfe):
+        self.name = name
+        self.hilfe = hilfe
+        self.werte = {}
+        self.lock = threading.Lock()
+
+    def beobachten(self, wert=1, **labels):
+        schluessel = tuple(sorted(labels.items()))
+        with self.lock:
+            self.werte[schluessel] = self.werte.get(schluessel, 0) + wert
+
+    def stand(self):
+        with self.lock:
+            return list(self.werte.items())
+
+    def addieren(self, werte, stand):
+        for labels, wert in stand:
+            schluessel = tuple(map(tuple, labels))
+            werte[schluessel] = werte.get(schluessel, 0) + wert
+
+    def ausgabe(self, werte=None):
+        zeilen = [f"# HELP {self.name} {self.hilfe}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for labels, wert in sorted((self.werte if werte is None else werte).items()):
+                zeilen.append(f"{self.name}{_label_text(labels)} {_zahl(wert)}")
+        return zeilen
+
+METRIKEN = {
+    'brief_phase_sekunden': Histogramm(
+        'brief_phase_sekunden',
+        'Dauer der einzelnen Phasen der Brieferstellung in Sekunden.',
+        ZEIT_GRENZEN),
+    'brief_seiten': Histogramm('brief_seiten', 'Seiten pro erstelltem Brief.', SEITEN_GRENZEN),
+    'brief_pdf_bytes': Histogramm('brief_pdf_bytes', 'Größe der erstellten PDFs in Bytes.', BYTE_GRENZEN),
+    'brief_anfragen_total': Zaehler('brief_anfragen_total', 'Anfragen an /generate nach Ergebnis.'),
+    'archiv_total': Zaehler('archiv_total', 'Archivierte PDFs nach Ergebnis.'),
+}
+
+_messung = threading.local()
+
+def beobachte(metrik, wert, **labels):
+    aufzeichnung = getattr(_messung, 'aufzeichnung', None)
+    if aufzeichnung is not None:
+        aufzeichnung.append((metrik, wert, labels))
+    else:
+        _eintragen(metrik, wert, labels)
+
+def uebernimm_aufzeichnung(aufzeichnung):
+    for metrik, wert, labels in aufzeichnung:
+        _eintragen(metrik, wert, labels)
+
+def _eintragen(metrik, wert, labels):
+    if METRIK_ORDNER and not _im_render_worker:
+        if _metrik_datei is None or _metrik_datei[0] != os.getpid():
+            _metrik_datei_anlegen()
+        _metrik_geaendert.set()
+    METRIKEN[metrik].beobachten(wert, **labels)
+
+# Metrik-Datei dieses Prozesses: (pid, Pfad). Ein Schreib-Thread legt die
+# Werte höchstens einmal pro Sekunde und beim Beenden ab. Der Name enthält
+# eine Zufallszahl, damit ein späterer Prozess mit derselben pid die Datei
+# eines beendeten Workers nicht überschreibt – dessen Zähler zählen weiter mit.
+_metrik_datei = None
+_metrik_geaendert = threading.Event()
+_metrik_lock = threading.Lock()
+
+def _metrik_datei_anlegen():
+    global _metrik_datei
+    with _metrik_lock:
+        if _metrik_datei is not None and _metrik_datei[0] == os.getpid():
+            return
+        if _metrik_datei is not None:
+            # Nach fork: geerbte Werte stehen schon in der Datei des Elternprozesses
+            for metrik in METRIKEN.values():
+                with metrik.lock:
+                    metrik.werte.clear()
+        ordner = BASE_DIR / METRIK_ORDNER
+        ordner.mkdir(parents=True, exist_ok=True)
+        pfad = ordner / f'metriken_{os.getpid()}_{uuid.uuid4().hex[:8]}.json'
+        _metrik_datei = (os.getpid(), pfad)
+    atexit.register(metriken_schreiben)
+    threading.Thread(target=_metrik_schreiber, name='metriken', daemon=True).start()
+
+def _metrik_schreiber():
+    while True:
+        _metrik_geaendert.wait()
+        _metrik_geaendert.clear()
+        metriken_schreiben()
+        time.sleep(1)
+
+def metriken_schreiben():
+    if _metrik_datei is None or _metrik_datei[0] != os.getpid():
+        return
+    pfad = _metrik_datei[1]
+    with _metrik_lock:
+        try:
+            inhalt = json.dumps({name: metrik.stand() for name, metrik in METRIKEN.items()})
+            pfad.with_suffix('.tmp').write_text(inhalt, encoding='utf-8')
+            os.replace(pfad.with_suffix('.tmp'), pfad)
+        except OSError:
+            app.logger.exception("Messwerte konnten nicht gespeichert werden")
+
+def metriken_aller_prozesse():
+    metriken_schreiben()
+    summen = {name: {} for name in METRIKEN}
+    for datei in (BASE_DIR / METRIK_ORDNER).glob('metriken_*.json'):
+        try:
+            stand = json.loads(datei.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            continue
+        for name, eintraege in stand.items():
+            if name in METRIKEN:
+                METRIKEN[name].addieren(summen[name], eintraege)
+    return summen
+
+class messe:
+    def __init__(self, phase):
+        self.phase = phase
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        beobachte('brief_phase_sekunden', time.perf_counter() - self.start, phase=self.phase)
+
+    def __call__(self, funktion):
+        @functools.wraps(funktion)
+        def gemessen(*args, **kwargs):
+            with messe(self.phase):
+                return funktion(*args, **kwargs)
+        return gemessen
+
+# Ausgabeprofile: "archiv" bettet die Bilder in Originalauflösung ein, "email"
+# rechnet sie auf bild_dpi bei der gezeichneten Größe herunter und komprimiert
+# sie stärker. zlib_stufe None = Voreinstellung von reportlab.
+AusgabeProfil = namedtuple('AusgabeProfil', 'bild_dpi zlib_stufe seiten_kompression')
+AUSGABE_PROFILE = {
+    'archiv': AusgabeProfil(None, None, True),
+    'email': AusgabeProfil(EMAIL_BILD_DPI, 9, EMAIL_SEITEN_KOMPRESSION),
+}
+
+def ausgabe_profil(daten):
+    return AUSGABE_PROFILE.get(daten.get('profil')) or AUSGABE_PROFILE['archiv']
+
+@lru_cache(maxsize=None)
+def reportlab_einstellen():
+    # Ströme binär statt ASCII85 schreiben: spart ein Viertel der Größe und
+    # Zeit beim Speichern. Gilt für den ganzen Prozess und alle Profile.
+    from reportlab import rl_config
+    from reportlab.pdfbase import pdfmetrics
+    rl_config.useA85 = 0
+    # TrueType-Schriften einmal pro Prozess laden
+    for name, pfad in ((SCHRIFT, TTF_SCHRIFT), (SCHRIFT_FETT, TTF_SCHRIFT_FETT)):
+        if pfad and name not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(_ttf_klasse()(name, str(BASE_DIR / pfad)))
+
+@lru_cache(maxsize=None)
+def _ttf_klasse():
+    from reportlab.pdfbase import pdfdoc
+    from reportlab.pdfbase.ttfonts import TTFont, SUBSETN
+
+    class FertigesObjekt(pdfdoc.PDFObject):
+        # Bereits formatierter PDF-Ausdruck (z.B. die Breitenliste)
+        def __init__(self, inhalt):
+            self.inhalt = inhalt
+
+        def format(self, document):
+            return self.inhalt
+
+    class GemeinsameTTFont(TTFont):
+        # reportlab vergibt die Zeichencodes einer TrueType-Schrift pro
+        # Dokument neu, jedes PDF bekommt so eigene Teilschriften. Hier gilt
+        # für Teilschrift 0 (bis zu 256 Zeichen) eine Zuordnung für den ganzen
+        # Prozess: sie wächst mit jedem neuen Zeichen, und jedes Dokument
+        # übernimmt sie. Text in Vorlagen ist so in jedem Dokument gültig, und
+        # die eingebettete Teilschrift (komprimiert) und ihre Breitenliste
+        # werden nur einmal je Inhalt erzeugt statt in jedem PDF. Zeichen, die
+        # nicht mehr hineinpassen, landen wie bisher in eigenen Teilschriften.
+        def __init__(self, name, pfad):
+            super().__init__(name, pfad)
+            self._gemeinsam = _GemeinsamesDokument()
+            self._lock = threading.Lock()
+            self._teilschriften = LRUCache(64)
+            self._erzeugen = self.face.makeSubset
+            self.face.makeSubset = lambda subset: self._teilschrift(subset)[0]
+
+        def _teilschrift(self, subset):
+            # (Schriftdatei, komprimiert, formatierte Breitenliste) je Inhalt
+            schluessel = tuple(subset)
+            eintrag = self._teilschriften.get(schluessel)
+            if eintrag is None:
+                daten = self._erzeugen(subset)
+                breiten = pdfdoc.PDFArray(list(map(self.face.getCharWidth, subset)))
+                eintrag = (daten, pdfdoc.PDFZCompress.encode(daten), breiten.format(None))
+                self._teilschriften.put(schluessel, eintrag)
+            return eintrag
+
+        def _abgleichen(self, doc, text=''):
+            with self._lock:
+                gemeinsam = self._assignState(self._gemeinsam)
+                vorhanden = self.face.charToGlyph
+                for code in sorted({ord(z) for z in text}):
+                    if gemeinsam.nextCode >= 256:
+                        break
+                    if code != 0xa0 and code in vorhanden and code not in gemeinsam.assignments:
+                        TTFont.splitString(self, chr(code), self._gemeinsam)
+                zustand = self._assignState(doc)
+                # Dokumente mit eigenen Teilschriften gibt es erst, wenn die
+                # gemeinsame voll ist; danach ändert sie sich nicht mehr.
+                if not zustand.frozen and zustand.nextCode <= gemeinsam.nextCode:
+                    zustand.assignments.update(gemeinsam.assignments)
+                    zustand.subsets[0] = list(gemeinsam.subsets[0])
+                    zustand.nextCode = gemeinsam.nextCode
+                return zustand
+
+        def splitString(self, text, doc, encoding='utf-8'):
+            if not isinstance(text, str):
+                text = text.decode('utf-8')
+            zustand = self.state.get(doc)
+            if zustand is None or not zustand.assignments.keys() >= set(map(ord, text)):
+                self._abgleichen(doc, text)
+            return super().splitString(text, doc, encoding)
+
+        def addObjects(self, doc):
+            # Vorlagen können Zeichen enthalten, die erst nach dem letzten
+            # Text dieses Dokuments in die gemeinsame Teilschrift kamen
+            zustand = self._abgleichen(doc)
+            teilschriften = [list(subset) for subset in zustand.subsets]
+            intern = zustand.internalName
+            super().addObjects(doc)
+            for n, subset in enumerate(teilschriften):
+                _, komprimiert, breiten = self._teilschrift(subset)
+                doc.idToObject['BasicFonts'].dict[f'{intern}+{n}'].Widths = FertigesObjekt(breiten)
+                if doc.compression:
+                    basis = (SUBSETN(n) + b'+' + self.face.name + self.face.subfontNameX).decode('pdfdoc')
+                    strom = doc.idToObject['fontFile:%s(%s)' % (self.face.filename, basis)]
+                    strom.content = komprimiert
+                    strom.dictionary['Filter'] = pdfdoc.PDFArray([pdfdoc.PDFName('FlateDecode')])
+
+        def nur_gemeinsam(self, doc):
+            # True, wenn das Dokument nur die gemeinsame Teilschrift benutzt
+            return len(self._assignState(doc).subsets) == 1
+
+    return GemeinsameTTFont
+
+class _GemeinsamesDokument:
+    # Platzhalter-Dokument, unter dem die gemeinsame Zuordnung gespeichert ist
+    pass
+
+def neuer_canvas(ziel, profil=None):
+    from reportlab.pdfgen import canvas
+    reportlab_einstellen()
+    profil = profil or AUSGABE_PROFILE['archiv']
+    return canvas.Canvas(ziel, pagesize=A4, pageCompression=int(profil.seiten_kompression))
+
+class LRUCache:
+    # Kleiner threadsicherer LRU-Cache mit fester Anzahl Einträge. Bei vielen
+    # Mandanten bleiben so nur die zuletzt benutzten Bilder und Vorlagen im
+    # Speicher, selten benutzte werden beim nächsten Brief neu geladen.
+    # Mit max_zeichen zählt zusätzlich die bei put angegebene Größe; Einträge,
+    # die allein größer sind, werden gar nicht aufgenommen.
+    def __init__(self, max_eintraege, max_zeichen=None):
+        self.max_eintraege = max_eintraege
+        self.max_zeichen = max_zeichen
+        self.eintraege = OrderedDict()
+        self.groessen = {}
+        self.zeichen = 0
+        self.lock = threading.Lock()
 
-STATIC_DIR.mkdir(exist_ok=True)
+    def get(self, schluessel):
+        with self.lock:
+            wert = self.eintraege.get(schluessel)
+            if wert is not None:
+                self.eintraege.move_to_end(schluessel)
+            return wert
 
-def get_wappen_base64(pfad):
-    if os.path.exists(pfad):
-        with open(pfad, 'rb') as img_file:
-            return base64.b64encode(img_file.read()).decode('utf-8')
-    return None
+    def put(self, schluessel, wert, groesse=0):
+        with self.lock:
+            if self.max_zeichen is not None and groesse > self.max_zeichen:
+                return
+            self.zeichen += groesse - self.groessen.pop(schluessel, 0)
+            if groesse:
+                self.groessen[schluessel] = groesse
+            self.eintraege[schluessel] = wert
+            self.eintraege.move_to_end(schluessel)
+            while len(self.eintraege) > max(self.max_eintraege, 1) or \
+                    (self.max_zeichen is not None and self.zeichen > self.max_zeichen):
+                alt, _ = self.eintraege.popitem(last=False)
+                self.zeichen -= self.groessen.pop(alt, 0)
+
+    def entferne(self, passt):
+        with self.lock:
+            for schluessel in [k for k in self.eintraege if passt(k)]:
+                del self.eintraege[schluessel]
+                self.zeichen -= self.groessen.pop(schluessel, 0)
+
+    def clear(self):
+        with self.lock:
+            self.eintraege.clear()
+            self.groessen.clear()
+            self.zeichen = 0
+
+    def __len__(self):
+        return len(self.eintraege)
+
+# Prozessweiter Bild-Cache: Schlüssel ist der Pfad mit der gewünschten
+# Variante (Höchstgröße in Pixeln, zlib-Stufe), gültig solange mtime und
+# Größe der Datei unverändert sind. Gehalten wird nur der fertig komprimierte
+# PDF-Bildstrom (inkl. Alpha-Maske), nicht das dekodierte Bild.
+BildEintrag = namedtuple('BildEintrag', 'mtime groesse name xobjekt smaske')
+_BILD_CACHE = LRUCache(BILD_CACHE_EINTRAEGE)
+
+def lade_bild(pfad, max_pixel=None, zlib_stufe=None):
+    pfad = str(pfad)
+    try:
+        st = os.stat(pfad)
+    except OSError:
+        _BILD_CACHE.entferne(lambda k: k[0] == pfad)
+        return None
+
+    schluessel = (pfad, max_pixel, zlib_stufe)
+    eintrag = _BILD_CACHE.get(schluessel)
+    if eintrag and eintrag.mtime == st.st_mtime_ns and eintrag.groesse == st.st_size:
+        return eintrag
+
+    from reportlab.lib.utils import ImageReader
+    from reportlab.pdfbase import pdfdoc
+    reportlab_einstellen()
+    quelle = pfad
+    if max_pixel:
+        quelle = verkleinertes_bild(pfad, max_pixel) or pfad
+    reader = ImageReader(quelle)
+    name = hashlib.md5(f"{pfad}:{st.st_mtime_ns}:{st.st_size}:{max_pixel}:{zlib_stufe}".encode('utf-8')).hexdigest()
+    xobjekt = pdfdoc.PDFImageXObject(name, reader, mask='auto')
+    smaske = getattr(xobjekt, '_smask', None)
+    if smaske is not None:
+        del xobjekt._smask
+    if zlib_stufe is not None:
+        neu_komprimieren(xobjekt, reader, zlib_stufe)
+        if smaske is not None:
+            neu_komprimieren(smaske, reader._dataA, zlib_stufe)
+
+    eintrag = BildEintrag(st.st_mtime_ns, st.st_size, name, xobjekt, smaske)
+    _BILD_CACHE.put(schluessel, eintrag)
+    return eintrag
+
+def verkleinertes_bild(pfad, max_pixel):
+    # Auf die Box max_pixel einpassen (Seitenverhältnis bleibt), nie vergrößern
+    from PIL import Image
+    bild = Image.open(pfad)
+    faktor = min(max_pixel[0] / bild.width, max_pixel[1] / bild.height)
+    if faktor >= 1:
+        return None
+    if bild.mode not in ('RGB', 'RGBA', 'L'):
+        bild = bild.convert('RGBA' if 'A' in bild.mode or 'transparency' in bild.info else 'RGB')
+    groesse = (max(1, round(bild.width * faktor)), max(1, round(bild.height * faktor)))
+    return bild.resize(groesse, Image.LANCZOS)
+
+def neu_komprimieren(xobjekt, reader, zlib_stufe):
+    # JPEGs bleiben unverändert (DCTDecode), Rohdaten mit anderer zlib-Stufe
+    if xobjekt._filters == ('FlateDecode',):
+        xobjekt.streamContent = zlib.compress(reader.getRGBData(), zlib_stufe)
+
+def leere_bild_cache():
+    _BILD_CACHE.clear()
+
+@messe('bilder')
+def zeichne_bild(c, pfad, x, y, breite, hoehe, profil=None):
+    # Entspricht c.drawImage(pfad, ..., preserveAspectRatio=True, mask='auto'),
+    # verwendet aber den bereits kodierten Bildstrom aus dem Cache.
+    max_pixel = None
+    if profil and profil.bild_dpi:
+        max_pixel = (math.ceil(breite / 72 * profil.bild_dpi), math.ceil(hoehe / 72 * profil.bild_dpi))
+    eintrag = lade_bild(pfad, max_pixel, profil.zlib_stufe if profil else None)
+    if eintrag is None:
+        return False
+
+    from reportlab.lib.boxstuff import aspectRatioFix
+    reg_name = registriere_bild(c._doc, eintrag)
+
+    x, y, breite, hoehe, _ = aspectRatioFix(True, 'c', x, y, breite, hoehe,
+                                            eintrag.xobjekt.width, eintrag.xobjekt.height)
+    c._currentPageHasImages = 1
+    c.saveState()
+    c.translate(x, y)
+    c.scale(breite, hoehe)
+    c._code.append("/%s Do" % reg_name)
+    c.restoreState()
+    c._formsinuse.append(eintrag.name)
+    return eintrag
+
+def registriere_bild(doc, eintrag):
+    from reportlab.pdfbase import pdfdoc
+    reg_name = doc.getXObjectName(eintrag.name)
+    if reg_name not in doc.idToObject:
+        xobjekt = copy.copy(eintrag.xobjekt)
+        if eintrag.smaske is not None:
+            m_reg_name = doc.getXObjectName(eintrag.smaske.name)
+            if m_reg_name in doc.idToObject:
+                xobjekt.smask = pdfdoc.PDFObjectReference(m_reg_name)
+            else:
+                xobjekt.smask = doc.Reference(copy.copy(eintrag.smaske), m_reg_name)
+        doc.Reference(xobjekt, reg_name)
+        doc.addForm(eintrag.name, xobjekt)
+    return reg_name
+
+# Vorlagen: feste Teile eines Briefs (Briefkopf je Wappen, Unterschriftsblock
+# je Absender) werden einmal pro Prozess auf einem Hilfs-Canvas gezeichnet.
+# Aufgenommen werden nur die Zeichenbefehle; jedes Dokument bekommt daraus ein
+# Form-XObject, dessen Schriften und Bilder auf die Objekte dieses Dokuments
+# zeigen. Ändert sich eine beteiligte Bilddatei, wird neu aufgenommen.
+# Passt TrueType-Text nicht in die gemeinsame Teilschrift, bleibt stream leer
+# und der Aufrufer zeichnet direkt.
+Vorlage = namedtuple('Vorlage', 'name stream schriften bilder bbox versatz')
+_VORLAGEN = LRUCache(VORLAGEN_CACHE_EINTRAEGE)
+
+def _datei_stand(pfad):
+    try:
+        st = os.stat(pfad)
+    except (OSError, TypeError):
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def hole_vorlage(art, pfade, zeichnen, *args):
+    schluessel = (art, args, tuple(_datei_stand(p) for p in pfade))
+    vorlage = _VORLAGEN.get(schluessel)
+    if vorlage is None:
+        from reportlab.pdfbase import pdfdoc
+        hilfs_canvas = neuer_canvas(io.BytesIO())
+        bbox, versatz, bilder = zeichnen(hilfs_canvas, *args)
+        schriften, teilbar = vorlagen_schriften(hilfs_canvas._doc)
+        vorlage = Vorlage(
+            "Vorlage_" + hashlib.md5(repr(schluessel).encode('utf-8')).hexdigest(),
+            pdfdoc.pdfdocEnc("\n".join(hilfs_canvas._code)) if teilbar else None,
+            schriften, tuple(bilder), bbox, versatz
+        )
+        _VORLAGEN.entferne(lambda k: k[:2] == schluessel[:2])
+        _VORLAGEN.put(schluessel, vorlage)
+    return vorlage
+
+def vorlagen_schriften(doc):
+    # Ressourcenname -> (Schrift, Teilschrift); TrueType-Text steht im
+    # Strom als /F1+0 und ist nur mit der gemeinsamen Teilschrift gültig
+    from reportlab.pdfbase.pdfmetrics import getFont
+    schriften = {}
+    teilbar = True
+    for ps, intern in doc.fontMapping.items():
+        schrift = getFont(ps)
+        if getattr(schrift, '_dynamicFont', False):
+            teilbar = teilbar and schrift.nur_gemeinsam(doc)
+            schriften[intern.lstrip('/') + '+0'] = (ps, 0)
+        else:
+            schriften[intern.lstrip('/')] = (ps, None)
+    return schriften, teilbar
+
+def setze_vorlage(c, vorlage):
+    registriere_vorlage(c, vorlage)
+    c.doForm(vorlage.name)
+
+def registriere_vorlage(c, vorlage):
+    if not c.hasForm(vorlage.name):
+        from reportlab.pdfbase import pdfdoc
+        doc = c._doc
+        form = pdfdoc.PDFFormXObject(*vorlage.bbox)
+        form.compression = c._pageCompression
+        form.stream = vorlage.stream
+        ressourcen = pdfdoc.PDFResourceDictionary()
+        ressourcen.allProcs()
+        ressourcen.Font = {}
+        for intern, (ps, teilschrift) in vorlage.schriften.items():
+            if teilschrift is None:
+                name = doc.getInternalFontName(ps)
+            else:
+                from reportlab.pdfbase.pdfmetrics import getFont
+                schrift = getFont(ps)
+                schrift.splitString('', doc)
+                name = schrift.getSubsetInternalName(teilschrift, doc)
+            ressourcen.Font[intern] = pdfdoc.PDFObjectReference(name.lstrip('/'))
+        ressourcen.XObject = {}
+        for eintrag in vorlage.bilder:
+            # Neben Bildern auch eingebettete Vorlagen (Aufzählungspunkte im Seitentext)
+            if isinstance(eintrag, Vorlage):
+                registriere_vorlage(c, eintrag)
+                reg_name = doc.getXObjectName(eintrag.name)
+            else:
+                reg_name = registriere_bild(doc, eintrag)
+            ressourcen.XObject[reg_name] = pdfdoc.PDFObjectReference(reg_name)
+        form.Resources = ressourcen
+        doc.addForm(vorlage.name, form)
+
+# Mandanten: jeder Mandant hat eigenen Namen, Anschrift, Wappen und
+# Unterschriften. "standard" ist config.py. Weitere Mandanten liegen als
+# <name>.py in MANDANTEN_ORDNER und werden erst beim ersten Brief geladen;
+# nicht gesetzte Werte kommen aus config.py, die Bilder aus dem Unterordner
+# ORDNER_STATIC (Standard: <name>/). Gewählt wird über das Feld "mandant".
+Mandant = namedtuple('Mandant', 'name stand familienname vorname_1 nachname_1 vorname_2 nachname_2 '
+                                'strasse plz_ort ort wappen_farbe wappen_sw unterschriften')
+STANDARD_MANDANT = 'standard'
+MANDANT_NAME = re.compile(r'[A-Za-z0-9_-]{1,64}')
+
+class UnbekannterMandant(ValueError):
+    pass
+
+def mandant_aus_config(name, werte, static_dir, stand=None):
+    return Mandant(
+        name, stand, werte.FAMILIENNAME,
+        werte.ABSENDER_VORNAME_1, werte.ABSENDER_NACHNAME_1,
+        werte.ABSENDER_VORNAME_2, werte.ABSENDER_NACHNAME_2,
+        werte.STRASSE, f"{werte.PLZ} {werte.ORT}", werte.ORT,
+        static_dir / werte.DATEI_WAPPEN_FARBE, static_dir / werte.DATEI_WAPPEN_SW,
+        (static_dir / werte.DATEI_UNTERSCHRIFT_1, static_dir / werte.DATEI_UNTERSCHRIFT_2),
+    )
+
+_standard_mandant = mandant_aus_config(STANDARD_MANDANT, config, STATIC_DIR)
+_MANDANTEN = LRUCache(MANDANTEN_CACHE)
+
+def hole_mandant(name=None):
+    if not name or name == STANDARD_MANDANT:
+        return _standard_mandant
+    if not MANDANTEN_ORDNER or not MANDANT_NAME.fullmatch(name):
+        raise UnbekannterMandant(f"Unbekannter Mandant: {name}")
+    ordner = BASE_DIR / MANDANTEN_ORDNER
+    pfad = ordner / f"{name}.py"
+    stand = _datei_stand(pfad)
+    if stand is None:
+        raise UnbekannterMandant(f"Unbekannter Mandant: {name}")
+
+    mandant = _MANDANTEN.get(name)
+    if mandant is None or mandant.stand != stand:
+        werte = {k: getattr(config, k) for k in dir(config) if k.isupper()}
+        werte['ORDNER_STATIC'] = name
+        werte.update((k, v) for k, v in runpy.run_path(str(pfad)).items() if k.isupper())
+        mandant = mandant_aus_config(name, types.SimpleNamespace(**werte), ordner / werte['ORDNER_STATIC'], stand)
+        _MANDANTEN.put(name, mandant)
+    return mandant
+
+def logos(mandant):
+    return {'farbe': mandant.wappen_farbe, 'sw': mandant.wappen_sw}
+
+# Briefmuster: Brieftexte mit {{platzhaltern}} als <name>.txt in
+# MUSTER_ORDNER. Beginnt die Datei mit "Betreff: ...", ist das der Betreff
+# (auch mit Platzhaltern). Ein Muster wird einmal pro Dateistand übersetzt:
+# Absätze ohne Platzhalter werden einmal umbrochen und behalten ihre Zeilen,
+# je Brief neu umbrochen werden nur die Absätze mit eingesetzten Werten.
+PLATZHALTER = re.compile(r'\{\{\s*(\w+)\s*\}\}')
+
+class UnbekanntesMuster(ValueError):
+    pass
+
+class FehlenderPlatzhalter(ValueError):
+    pass
+
+class Muster:
+    def __init__(self, name, stand, betreff, text):
+        self.name = name
+        self.stand = stand
+        self.betreff = betreff
+        self.absaetze = text.split('\n')
+        self.variabel = [bool(PLATZHALTER.search(absatz)) for absatz in self.absaetze]
+        self.platzhalter = list(dict.fromkeys(PLATZHALTER.findall(betreff + '\n' + text)))
+        # (Schrift, Größe, Breite, Blocksatz) -> Zeilen je festem Absatz
+        self._feste_zeilen = {}
+
+    def einsetzen(self, text, werte):
+        # Fehlende Werte bleiben als {{name}} stehen (Vorschau beim Tippen)
+        return PLATZHALTER.sub(lambda m: werte.get(m.group(1), m.group(0)), text)
+
+    def brieftext(self, werte):
+        return "\n".join(self.einsetzen(absatz, werte) if variabel else absatz
+                         for absatz, variabel in zip(self.absaetze, self.variabel))
+
+    def zeilen(self, werte, font, font_size, max_width, blocksatz=False):
+        # Wie text_in_zeilen_aufteilen(self.brieftext(werte), ...)
+        schluessel = (font, font_size, max_width, blocksatz)
+        feste = self._feste_zeilen.get(schluessel)
+        if feste is None:
+            feste = [None if variabel else absatz_zeilen(absatz, *schluessel) if absatz.strip() else ()
+                     for absatz, variabel in zip(self.absaetze, self.variabel)]
+            self._feste_zeilen[schluessel] = feste
+        
+        zeilen = []
+        for i, (absatz, fest) in enumerate(zip(self.absaetze, feste)):
+            if i > 0:
+                zeilen.append("")
+            if fest is None:
+                # Eingesetzte Werte können selbst Zeilenumbrüche enthalten
+                zeilen.extend(text_in_zeilen_aufteilen(self.einsetzen(absatz, werte), *schluessel))
+            else:
+                zeilen.extend(fest)
+        return zeilen
+
+_MUSTER = LRUCache(64)
+
+def hole_muster(name):
+    if not MUSTER_ORDNER or not MANDANT_NAME.fullmatch(name or ''):
+        raise UnbekanntesMuster(f"Unbekanntes Briefmuster: {name}")
+    pfad = BASE_DIR / MUSTER_ORDNER / f"{name}.txt"
+    stand = _datei_stand(pfad)
+    if stand is None:
+        raise UnbekanntesMuster(f"Unbekanntes Briefmuster: {name}")
+
+    muster = _MUSTER.get(name)
+    if muster is None or muster.stand != stand:
+        text = pfad.read_text(encoding='utf-8-sig').replace('\r\n', '\n').replace('\r', '\n')
+        betreff = ''
+        if text.startswith('Betreff:'):
+            kopf, _, text = text.partition('\n')
+            betreff = kopf[len('Betreff:'):].strip()
+            if text.startswith('\n'):
+                text = text[1:]
+        muster = Muster(name, stand, betreff, text.rstrip('\n'))
+        _MUSTER.put(name, muster)
+    return muster
+
+def alle_muster():
+    if not MUSTER_ORDNER:
+        return []
+    namen = sorted(p.stem for p in (BASE_DIR / MUSTER_ORDNER).glob('*.txt') if MANDANT_NAME.fullmatch(p.stem))
+    return [hole_muster(name) for name in namen]
+
+def muster_werte(formular, muster, pflicht=True):
+    # Werte kommen aus gleichnamigen Formularfeldern, beim Serienbrief auch
+    # aus weiteren Spalten der Empfängerliste; {{datum}} ist heute.
+    werte = {'datum': date.today().strftime("%d.%m.%Y")}
+    werte.update((k, v) for k, v in formular.items() if isinstance(v, str))
+    werte.update(formular.get('werte') or {})
+    werte = {k: v.replace('\r\n', '\n').replace('\r', '\n') for k, v in werte.items()}
+    fehlend = [p for p in muster.platzhalter if p not in werte]
+    if pflicht and fehlend:
+        raise FehlenderPlatzhalter(f"Wert fehlt für: {', '.join(fehlend)}")
+    return {p: werte[p] for p in muster.platzhalter if p in werte}
+
+def logo_fingerabdruck(pfad):
+    try:
+        st = os.stat(pfad)
+    except OSError:
+        return None
+    return hashlib.md5(f"{st.st_mtime_ns}:{st.st_size}".encode('utf-8')).hexdigest()[:12]
 
 HTML_TEMPLATE = """
 <!DOCTYPE html>
@@ -377,14 +1176,31 @@ HTML_TEMPLATE = """
         .success-message.show {
             right: 20px;
         }
+        
+        .vorschau {
+            display: none;
+            margin-top: 40px;
+        }
+        
+        .vorschau.show {
+            display: block;
+        }
+        
+        .vorschau iframe {
+            width: 100%;
+            height: 900px;
+            border: 2px solid #e1e8ed;
+            border-radius: 12px;
+            background: #ffffff;
+        }
     </style>
 </head>
 <body>
     <div class="container">
         <div class="header-section">
             <div class="wappen-container">
-                {% if wappen_base64 %}
-                <img src="data:image/png;base64,{{ wappen_base64 }}" alt="Familie Menke Wappen" class="wappen-img">
+                {% if wappen_url %}
+                <img src="{{ wappen_url }}" alt="Familie Menke Wappen" class="wappen-img">
                 {% else %}
                 <div class="wappen-placeholder">M</div>
                 {% endif %}
@@ -395,13 +1211,14 @@ HTML_TEMPLATE = """
         </div>
         
         <form method="POST" action="/generate" id="briefForm">
+            <input type="hidden" name="mandant" value="{{mandant}}">
             
             <div class="section-title">Logo-Auswahl</div>
             <div class="form-group">
                 <div class="logo-preview">
                     <div class="logo-option selected" onclick="selectLogo(this, '1')">
-                        {% if wappen_farbe_base64 %}
-                        <img src="data:image/png;base64,{{ wappen_farbe_base64 }}" alt="Farbiges Wappen">
+                        {% if wappen_farbe_url %}
+                        <img src="{{ wappen_farbe_url }}" alt="Farbiges Wappen">
                         {% else %}
                         <div style="width: 80px; height: 80px; background: linear-gradient(135deg, #667eea, #764ba2); border-radius: 50%; margin: 0 auto 10px;"></div>
                         {% endif %}
@@ -409,8 +1226,8 @@ HTML_TEMPLATE = """
                         <label for="logo1">Farbiges Wappen</label>
                     </div>
                     <div class="logo-option" onclick="selectLogo(this, '2')">
-                        {% if wappen_sw_base64 %}
-                        <img src="data:image/png;base64,{{ wappen_sw_base64 }}" alt="Schwarz-Weiß Wappen">
+                        {% if wappen_sw_url %}
+                        <img src="{{ wappen_sw_url }}" alt="Schwarz-Weiß Wappen">
                         {% else %}
                         <div style="width: 80px; height: 80px; background: #2c3e50; border-radius: 50%; margin: 0 auto 10px;"></div>
                         {% endif %}
@@ -489,9 +1306,40 @@ HTML_TEMPLATE = """
                 <label for="grußformel">Grußformel <span class="hint">(Standard: "Mit freundlichen Grüßen,")</span></label>
                 <input type="text" id="grußformel" name="grußformel" placeholder="Mit freundlichen Grüßen,">
             </div>
+            <div class="form-group">
+                <label>Textausrichtung</label>
+                <div class="radio-group">
+                    <div class="radio-option">
+                        <input type="radio" id="ausrichtung_links" name="ausrichtung" value="links" {% if not blocksatz %}checked{% endif %}>
+                        <label for="ausrichtung_links">Linksbündig</label>
+                    </div>
+                    <div class="radio-option">
+                        <input type="radio" id="ausrichtung_blocksatz" name="ausrichtung" value="blocksatz" {% if blocksatz %}checked{% endif %}>
+                        <label for="ausrichtung_blocksatz">Blocksatz</label>
+                    </div>
+                </div>
+            </div>
+            <div class="form-group">
+                <label>PDF für</label>
+                <div class="radio-group">
+                    <div class="radio-option">
+                        <input type="radio" id="profil_archiv" name="profil" value="archiv" {% if profil != 'email' %}checked{% endif %}>
+                        <label for="profil_archiv">Archiv (volle Qualität)</label>
+                    </div>
+                    <div class="radio-option">
+                        <input type="radio" id="profil_email" name="profil" value="email" {% if profil == 'email' %}checked{% endif %}>
+                        <label for="profil_email">E-Mail (kleine Datei)</label>
+                    </div>
+                </div>
+            </div>
 
             <button type="submit">Brief als PDF herunterladen</button>
         </form>
+        
+        <div class="vorschau" id="vorschau">
+            <div class="section-title">Vorschau <span class="hint" id="vorschauSeite"></span></div>
+            <iframe id="vorschauRahmen" title="Vorschau"></iframe>
+        </div>
     </div>
     
     <div class="success-message" id="successMessage">
@@ -514,66 +1362,590 @@ HTML_TEMPLATE = """
                 successMsg.classList.remove('show');
             }, 3000);
         });
+        
+        // Vorschau: kurz nach der letzten Eingabe die Seite mit dem Absatz
+        // unter dem Cursor neu anfordern
+        let vorschauTimer = null;
+        let vorschauUrl = null;
+        let vorschauAbsatz = 0;
+        
+        async function vorschauLaden() {
+            const form = document.getElementById('briefForm');
+            const brieftext = document.getElementById('brieftext');
+            if (!brieftext.value.trim()) {
+                return;
+            }
+            if (document.activeElement === brieftext) {
+                vorschauAbsatz = brieftext.value.slice(0, brieftext.selectionStart).split('\\n').length - 1;
+            }
+            const daten = new FormData(form);
+            daten.append('absatz', vorschauAbsatz);
+            const antwort = await fetch('/preview', {method: 'POST', body: daten});
+            if (!antwort.ok) {
+                return;
+            }
+            const url = URL.createObjectURL(await antwort.blob());
+            document.getElementById('vorschauRahmen').src = url + '#toolbar=0&view=FitH';
+            if (vorschauUrl) {
+                URL.revokeObjectURL(vorschauUrl);
+            }
+            vorschauUrl = url;
+            document.getElementById('vorschauSeite').textContent =
+                '(Seite ' + antwort.headers.get('X-Seite') + ' von ' + antwort.headers.get('X-Seiten') + ')';
+            document.getElementById('vorschau').classList.add('show');
+        }
+        
+        document.getElementById('briefForm').addEventListener('input', function() {
+            clearTimeout(vorschauTimer);
+            vorschauTimer = setTimeout(vorschauLaden, 400);
+        });
     </script>
 </body>
 </html>
 """
 
-def zeichne_fusszeile(c, seite, breite, hoehe):
+def zeichne_fusszeile(c, seite, breite, hoehe, seiten=None):
     y_pos = 1.5 * cm
     x_pos = breite / 2
-    fuss_text = f"Seite {seite}"
-    c.setFont("Helvetica", 9)
+    fuss_text = f"Seite {seite} von {seiten}" if seiten else f"Seite {seite}"
+    c.setFont(SCHRIFT, 9)
     c.drawCentredString(x_pos, y_pos, fuss_text)
 
-def erstelle_brief_pdf(daten):
+# Zeilenumbruch
+# Wortbreiten werden in Tausendstel der Schriftgröße gerechnet, wie sie in der
+# Breitentabelle der Schrift stehen. Bei den Standardschriften sind das ganze
+# Zahlen; eine Zeile passt genau dann, wenn stringWidth der ganzen Zeile passt.
+_WORTBREITEN = {}
+_WORTBREITEN_ZEICHEN = {}
+
+# TrueType-Schriften haben Breiten je Unicode-Zeichen (keine ganzen Zahlen);
+# gemessen wird wie bei reportlab mit der Standardbreite für fehlende Zeichen.
+@lru_cache(maxsize=None)
+def breitentabelle(font):
+    from reportlab.pdfbase.pdfmetrics import getFont
+    reportlab_einstellen()
+    schrift = getFont(font)
+    if getattr(schrift, '_dynamicFont', False):
+        return schrift.face.charWidths, schrift.face.defaultWidth
+    return schrift.widths, schrift.encName
+
+def wortbreiten(woerter, font):
+    # Alle noch unbekannten Wörter auf einmal über die Breitentabelle messen
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+    # Begrenzt nach Anzahl und Gesamtlänge der Wörter; ist eine Grenze
+    # erreicht, fängt der Cache der Schrift von vorn an.
+    cache = _WORTBREITEN.get(font)
+    fehlend = set(woerter).difference(cache or ())
+    zeichen = _WORTBREITEN_ZEICHEN.get(font, 0) + sum(map(len, fehlend))
+    if cache is None or len(cache) + len(fehlend) > WORTBREITEN_CACHE_GROESSE \
+            or zeichen > WORTBREITEN_CACHE_ZEICHEN:
+        cache = _WORTBREITEN[font] = {}
+        fehlend = set(woerter)
+        zeichen = sum(map(len, fehlend))
+    _WORTBREITEN_ZEICHEN[font] = zeichen
+    if fehlend:
+        breiten, kodierung = breitentabelle(font)
+        if isinstance(breiten, dict):
+            standard = kodierung
+            for wort in fehlend:
+                cache[wort] = sum(breiten.get(ord(z), standard) for z in wort)
+        else:
+            for wort in fehlend:
+                try:
+                    cache[wort] = sum(map(breiten.__getitem__, wort.encode(kodierung)))
+                except UnicodeEncodeError:
+                    # Zeichen aus Ersatzschriften: reportlab messen lassen
+                    cache[wort] = stringWidth(wort, font, 1000)
+    return list(map(cache.__getitem__, woerter))
+
+def einheiten_grenze(font, font_size, max_width):
+    # Größte Breite in Tausendsteln, die bei font_size noch in max_width passt
+    if isinstance(breitentabelle(font)[0], dict):
+        return max_width / (0.001 * font_size)
+    grenze = int(max_width / (0.001 * font_size))
+    while (grenze + 1) * 0.001 * font_size <= max_width:
+        grenze += 1
+    while grenze * 0.001 * font_size > max_width:
+        grenze -= 1
+    return grenze
+
+def zeilen_umbrechen(woerter, font, font_size, max_width):
+    return [zeile for zeile, _ in absatz_umbrechen(woerter, font, font_size, max_width)]
+
+def absatz_umbrechen(woerter, font, font_size, max_width, blocksatz=False, erste_breite=None):
+    # Liefert (Zeile, Wortabstand) – der Wortabstand in Punkt ist nur im
+    # Blocksatz gesetzt und wird beim Zeichnen als wordSpace übergeben.
+    if not woerter:
+        return []
+    breiten = wortbreiten(woerter, font)
+    leer = wortbreiten([" "], font)[0]
+    grenze = einheiten_grenze(font, font_size, max_width)
+    erste_grenze = grenze if erste_breite is None else einheiten_grenze(font, font_size, erste_breite)
+
+    if not blocksatz:
+        return [(" ".join(woerter[i:j]), 0) for i, j in _umbruch_gierig(breiten, leer, erste_grenze, grenze)]
+
+    zeilen = []
+    for i, j in _umbruch_optimal(breiten, leer, erste_grenze, grenze):
+        zeile = " ".join(woerter[i:j])
+        luecken = j - i - 1
+        natuerlich = sum(breiten[i:j]) + luecken * leer
+        g = erste_grenze if i == 0 else grenze
+        # Letzte Zeile bleibt linksbündig, außer sie muss gestaucht werden
+        if luecken and (j < len(woerter) or natuerlich > g):
+            zeilen.append((zeile, (g - natuerlich) * 0.001 * font_size / luecken))
+        else:
+            zeilen.append((zeile, 0))
+    return zeilen
+
+def _umbruch_gierig(breiten, leer, erste_grenze, grenze):
+    # Wie bisher: so viele Wörter wie passen; ein zu langes Wort steht allein
+    umbrueche = []
+    start = 0
+    zeilen_breite = breiten[0]
+    g = erste_grenze
+    for k in range(1, len(breiten)):
+        test_breite = zeilen_breite + leer + breiten[k]
+        if test_breite <= g:
+            zeilen_breite = test_breite
+        else:
+            umbrueche.append((start, k))
+            start = k
+            zeilen_breite = breiten[k]
+            g = grenze
+    umbrueche.append((start, len(breiten)))
+    return umbrueche
+
+BLOCKSATZ_DEHNUNG = 1 / 2      # je Leerzeichen, Anteil der Leerzeichenbreite
+BLOCKSATZ_STAUCHUNG = 1 / 3
+BLOCKSATZ_TOLERANZ = 3         # maximales Dehnungsverhältnis, bevor nur noch Notlösungen bleiben
+
+def _umbruch_optimal(breiten, leer, erste_grenze, grenze):
+    # Knuth–Plass ohne Silbentrennung: Umbrüche so wählen, dass die Summe der
+    # Strafpunkte (10 + 100·|r|³)² aller Zeilen minimal wird; r ist das
+    # Dehnungs- bzw. Stauchungsverhältnis der Wortabstände. Die Zeilenbreite ist
+    # über Präfixsummen O(1); für jeden erreichbaren Zeilenanfang werden nur die
+    # wenigen Enden im zulässigen Bereich geprüft.
+    n = len(breiten)
+    dehnung = leer * BLOCKSATZ_DEHNUNG
+    stauchung = leer * BLOCKSATZ_STAUCHUNG
+    summen = list(accumulate(map(leer.__add__, breiten), initial=0))
+    gestaucht = list(accumulate(map((leer - stauchung).__add__, breiten), initial=0))
+    bis = bisect.bisect_right
+
+    unendlich = float('inf')
+    kosten = [unendlich] * (n + 1)
+    vorher = [0] * (n + 1)
+    kosten[0] = 0
+    g = erste_grenze
+    for i in range(n):
+        basis = kosten[i]
+        if basis == unendlich:
+            continue
+        if i:
+            g = grenze
+        # Letztes Ende, bei dem die Zeile maximal gestaucht noch passt
+        j_max = bis(gestaucht, gestaucht[i] + leer - stauchung + g, i + 1) - 1
+        if j_max <= i:
+            j_max = i + 1
+        start = summen[i] + leer
+        for j in range(j_max, i, -1):
+            rest = g - summen[j] + start
+            luecken = j - i - 1
+            if rest >= 0:
+                if j == n:
+                    schlecht = 0
+                elif luecken:
+                    r = rest / (luecken * dehnung)
+                    if r > BLOCKSATZ_TOLERANZ and j < j_max:
+                        break
+                    schlecht = 100 * r * r * r
+                elif j < j_max:
+                    break
+                else:
+                    schlecht = 10000
+            elif luecken:
+                r = -rest / (luecken * stauchung)
+                schlecht = 100 * r * r * r
+            else:
+                schlecht = 10000
+            if schlecht > 10000:
+                schlecht = 10000
+            summe = basis + (10 + schlecht) * (10 + schlecht)
+            if summe < kosten[j]:
+                kosten[j] = summe
+                vorher[j] = i
+
+    umbrueche = []
+    j = n
+    while j > 0:
+        umbrueche.append((vorher[j], j))
+        j = vorher[j]
+    umbrueche.reverse()
+    return umbrueche
+
+def _briefkopf_zeichnen(c, wappen_pfad, familienname, profil):
+    breite, hoehe = c._pagesize
+    wappen_hoehe_pos = hoehe - 3.5*cm
+    wappen_breite = 3*cm
+
+    bilder = []
+    try:
+        eintrag = zeichne_bild(c, wappen_pfad,
+                               (breite - wappen_breite) / 2, wappen_hoehe_pos,
+                               wappen_breite, wappen_breite, profil)
+        if eintrag:
+            bilder.append(eintrag)
+    except:
+        pass
+
+    linie_y = wappen_hoehe_pos + (wappen_breite / 2)
+
+    linke_linie_start = 1*cm
+    linke_linie_ende = (breite - wappen_breite) / 2 - 0.5*cm
+    c.line(linke_linie_start, linie_y, linke_linie_ende, linie_y)
+
+    rechte_linie_start = (breite + wappen_breite) / 2 + 0.5*cm
+    rechte_linie_ende = breite - 1*cm
+    c.line(rechte_linie_start, linie_y, rechte_linie_ende, linie_y)
+
+    # PERSÖNLICHE DATEN - Familienname ändern:
+    c.setFont(SCHRIFT_FETT, 11)
+    familie_text = "Familie " + familienname
+    text_breite_familie = c.stringWidth(familie_text, SCHRIFT_FETT, 11)
+    c.drawString(rechte_linie_ende - text_breite_familie, linie_y + 0.3*cm, familie_text)
+
+    return (0, 0, breite, hoehe), 0, bilder
+
+def zeichne_briefkopf(c, wappen_pfad, profil=None, mandant=None):
+    # Wappen, Linien und "Familie ..." sind auf jeder Seite gleich: als
+    # Vorlage einmal pro Dokument anlegen und auf jeder Seite nur referenzieren.
+    mandant = mandant or _standard_mandant
+    vorlage = hole_vorlage('briefkopf', (wappen_pfad,), _briefkopf_zeichnen,
+                           str(wappen_pfad), mandant.familienname, profil)
+    if vorlage.stream is None:
+        _briefkopf_zeichnen(c, str(wappen_pfad), mandant.familienname, profil)
+    else:
+        setze_vorlage(c, vorlage)
+
+def _unterschriften_zeichnen(c, absender_auswahl, absender_name, mandant, profil):
+    # Zeichnet relativ zu y = 0 (Zeile unter der Grußformel) und liefert den
+    # verbrauchten Platz als Versatz zurück.
+    breite, hoehe = c._pagesize
+    left_margin = 2.5*cm
+    y_pos = 0
+    bilder = []
+    c.setFont(SCHRIFT, 11)
+
+    def bild(pfad, x):
+        eintrag = zeichne_bild(c, pfad, x, y_pos, unterschrift_breite, unterschrift_hoehe, profil)
+        if eintrag:
+            bilder.append(eintrag)
+
+    # PERSÖNLICHE DATEN - Unterschriftsdateien anpassen. Vielleicht Pfade ändern:
+    if absender_auswahl == 'b':
+        unterschrift_sophia, unterschrift_conrad = mandant.unterschriften
+        
+        unterschrift_hoehe = 2.5*cm
+        unterschrift_breite = 5*cm
+        y_pos -= 2.2*cm
+        
+        if unterschrift_sophia.exists():
+            try:
+                bild(unterschrift_sophia, left_margin)
+            except:
+                pass
+        
+        rechte_position = breite / 2 + 1*cm
+        if unterschrift_conrad.exists():
+            try:
+                bild(unterschrift_conrad, rechte_position)
+            except:
+                pass
+        
+        y_pos -= 0.5*cm
+        c.drawString(left_margin, y_pos, mandant.vorname_1 + " " + mandant.nachname_1)
+        c.drawString(rechte_position, y_pos, mandant.vorname_2 + " " + mandant.nachname_2)
+    
+    else:
+        unterschrift_datei = None
+        unterschrift_hoehe = 2.5*cm
+        unterschrift_breite = 5*cm
+        if absender_auswahl == 's':
+            unterschrift_datei = mandant.unterschriften[0]
+        elif absender_auswahl == 'c':
+            unterschrift_datei = mandant.unterschriften[1]
+        
+        if unterschrift_datei and unterschrift_datei.exists():
+            try:
+                y_pos -= 2.2*cm
+                bild(unterschrift_datei, left_margin)
+                y_pos -= 0.5*cm
+            except:
+                pass
+        else:
+            y_pos -= 2*cm
+        
+        c.drawString(left_margin, y_pos, absender_name)
+
+    return (0, -hoehe, breite, hoehe), y_pos, bilder
+
+def zeichne_unterschriften(c, absender_auswahl, absender_name, y_pos, profil=None, mandant=None):
+    mandant = mandant or _standard_mandant
+    vorlage = hole_vorlage('unterschriften', mandant.unterschriften, _unterschriften_zeichnen,
+                           absender_auswahl, absender_name, mandant, profil)
+    c.saveState()
+    c.translate(0, y_pos)
+    if vorlage.stream is None:
+        _unterschriften_zeichnen(c, absender_auswahl, absender_name, mandant, profil)
+    else:
+        setze_vorlage(c, vorlage)
+    c.restoreState()
+    return y_pos + vorlage.versatz
+
+# Text einer Aufzählung beginnt so weit rechts vom Rand (siehe zeichne_brief)
+AUFZAEHLUNG_EINZUG = 0.8*cm + 0.5*cm
+
+@messe('umbruch')
+def text_in_zeilen_aufteilen(text, font, font_size, max_width, blocksatz=False):
+    zeilen = []
+    absaetze = text.split('\n')
+    
+    for i, absatz in enumerate(absaetze):
+        if i > 0:
+            zeilen.append("")
+        
+        if not absatz.strip():
+            continue
+        
+        zeilen.extend(absatz_zeilen(absatz, font, font_size, max_width, blocksatz))
+    
+    return zeilen
+
+# Absätze sind voneinander unabhängig: beim erneuten Umbruch eines geänderten
+# Texts (Vorschau beim Tippen, Serienbriefe) kommen alle unveränderten Absätze
+# aus dem Cache, neu umbrochen wird nur, was sich geändert hat. Der Cache ist
+# nach Einträgen und nach Zeichen (Absatz plus Zeilen) begrenzt, damit viele
+# sehr lange Absätze den Speicher nicht füllen.
+_ABSATZ_CACHE = LRUCache(ABSATZ_CACHE_EINTRAEGE, ABSATZ_CACHE_ZEICHEN)
+
+def absatz_zeilen(absatz, font, font_size, max_width, blocksatz=False):
+    schluessel = (absatz, font, font_size, max_width, blocksatz)
+    zeilen = _ABSATZ_CACHE.get(schluessel)
+    if zeilen is None:
+        zeilen = _absatz_zeilen(absatz, font, font_size, max_width, blocksatz)
+        _ABSATZ_CACHE.put(schluessel, zeilen, len(absatz) + sum(len(zeile[1]) for zeile in zeilen))
+    return zeilen
+
+def _absatz_zeilen(absatz, font, font_size, max_width, blocksatz):
+    zeilen = []
+    stripped = absatz.strip()
+    is_bullet = stripped.startswith(("•", "-", "*"))
+    if is_bullet:
+        absatz = stripped[1:].strip()
+    
+    # Im Blocksatz muss die eingerückte erste Zeile einer Aufzählung
+    # schmaler sein, sonst läge ihr rechter Rand außerhalb.
+    erste_breite = max_width - AUFZAEHLUNG_EINZUG if blocksatz and is_bullet else None
+    for aktuelle_zeile, wortabstand in absatz_umbrechen(absatz.split(), font, font_size, max_width,
+                                                        blocksatz, erste_breite):
+        zeilen.append(('bullet' if is_bullet else 'normal', aktuelle_zeile, wortabstand))
+        is_bullet = False
+    
+    return tuple(zeilen)
+
+def erstelle_brief_pdf(daten, layout=None, verteilen=False):
+    buffer = io.BytesIO()
+    c = neuer_canvas(buffer, ausgabe_profil(daten))
+    layout = layout or brief_layout(daten)
+    seiten_inhalt = seiten_verteilen(c, daten, layout) if verteilen else None
+    zeichne_brief(c, daten, layout, seiten_inhalt=seiten_inhalt)
+    seiten = c.getPageNumber()
+    with messe('speichern'):
+        c.save()
+    beobachte('brief_seiten', seiten)
+    beobachte('brief_pdf_bytes', buffer.tell())
+    buffer.seek(0)
+    return buffer
+
+def erstelle_vorschau_pdf(daten, seite=None, absatz=0):
+    # Nur eine Seite (Standard: die mit dem bearbeiteten Absatz) als kleines
+    # PDF. Kopf- und Unterschriftsvorlagen und der Umbruch aller unveränderten
+    # Absätze kommen aus den Caches. Liefert (Puffer, Seite, Seitenzahl).
+    daten = dict(daten, profil='email')
+    layout = brief_layout(daten)
+    seiten = len(layout.seiten)
+    seite = min(max(1, seite or seite_von_absatz(layout, absatz)), seiten)
     buffer = io.BytesIO()
+    c = neuer_canvas(buffer, ausgabe_profil(daten))
+    zeichne_brief(c, daten, layout, nur_seite=seite)
+    c.save()
+    buffer.seek(0)
+    return buffer, seite, seiten
+
+# Seitenaufteilung eines Briefs ohne Canvas: Betreffzeilen mit y-Position,
+# je Seite die Textzeilen mit y-Position und wo die Grußformel steht.
+BriefLayout = namedtuple('BriefLayout', 'betreff anrede_y seiten schluss_y')
+
+@messe('layout')
+def brief_layout(daten):
     breite, hoehe = A4
-    c = canvas.Canvas(buffer, pagesize=A4)
+    line_height = 0.5*cm
+    
+    betreff = []
+    betreff_y = hoehe - 11*cm
+    for zeile in zeilen_umbrechen(daten['betreff'].split(), SCHRIFT_FETT, 12, breite - 5*cm):
+        betreff.append((betreff_y, zeile))
+        betreff_y -= 0.5*cm
+    anrede_y = betreff_y - 0.5*cm
+    
     brieftext = daten['brieftext'].replace('\r\n', '\n').replace('\r', '\n')
+    blocksatz = daten.get('blocksatz', False)
+    zeilen = None
+    if daten.get('muster'):
+        # Briefmuster: nur die Absätze mit Platzhaltern neu umbrechen,
+        # solange das Muster noch den Text des Briefs ergibt
+        try:
+            muster = hole_muster(daten['muster'])
+        except UnbekanntesMuster:
+            muster = None
+        if muster and muster.brieftext(daten['werte']) == brieftext:
+            zeilen = muster.zeilen(daten['werte'], SCHRIFT, 11, breite - 5*cm, blocksatz)
+    if zeilen is None:
+        zeilen = text_in_zeilen_aufteilen(brieftext, SCHRIFT, 11, breite - 5*cm, blocksatz)
+    
+    # Folgeseiten beginnen unter dem Briefkopf; unter 4 cm kommt keine
+    # Zeile mehr, für Grußformel und Unterschrift braucht es 5 cm.
+    seiten = [[]]
+    y_pos = anrede_y - 1*cm
+    for zeile_info in zeilen:
+        if y_pos < 4*cm:
+            seiten.append([])
+            y_pos = hoehe - 5*cm
+        seiten[-1].append((y_pos, zeile_info))
+        y_pos -= line_height
+    
+    if y_pos < 5*cm:
+        seiten.append([])
+        y_pos = hoehe - 5*cm
+    return BriefLayout(betreff, anrede_y, seiten, y_pos)
+
+def layout_als_dict(layout):
+    # Für /layout: Positionen in Punkt von unten links, wie im PDF
+    seiten = []
+    for nr, eintraege in enumerate(layout.seiten, 1):
+        zeilen = []
+        for y_pos, zeile_info in eintraege:
+            if zeile_info == "":
+                zeilen.append({'y': round(y_pos, 2), 'typ': 'leer'})
+                continue
+            zeilen_typ, zeilen_text, wortabstand = zeile_info
+            zeilen.append({'y': round(y_pos, 2), 'typ': zeilen_typ, 'text': zeilen_text,
+                           'wortabstand': round(wortabstand, 4)})
+        seiten.append({'seite': nr, 'zeilen': zeilen})
+    return {
+        'seiten': len(layout.seiten),
+        'betreff': [{'y': round(y_pos, 2), 'text': zeile} for y_pos, zeile in layout.betreff],
+        'anrede_y': round(layout.anrede_y, 2),
+        'zeilen': sum(len(eintraege) for eintraege in layout.seiten),
+        'seitenplan': seiten,
+        'schluss': {'seite': len(layout.seiten), 'y': round(layout.schluss_y - 1*cm, 2)},
+    }
+
+def seite_von_absatz(layout, absatz):
+    # Seite, auf der Absatz Nummer absatz (ab 0) beginnt
+    gesehen = 0
+    for nr, eintraege in enumerate(layout.seiten, 1):
+        for _, zeile_info in eintraege:
+            if zeile_info == "":
+                gesehen += 1
+            elif gesehen >= absatz:
+                return nr
+    return len(layout.seiten)
+
+def zeichne_seitentext(c, eintraege, seite, seiten):
+    # Fußzeile und Textzeilen einer Seite, ohne Briefkopf. Der ganze Text
+    # steht in einem Textobjekt: jede Zeile rückt relativ zur vorigen vor
+    # (T* bei gleichem Einzug, sonst Td), der Wortabstand wird nur gesetzt,
+    # wenn er sich ändert. Aufzählungspunkte sind eine gemeinsame Vorlage.
+    from reportlab.lib.rl_accel import fp_str
+    breite, hoehe = A4
+    left_margin = 2.5*cm
+    line_height = 0.5*cm
+    zeichne_fusszeile(c, seite, breite, hoehe, seiten)
+    c.setFont(SCHRIFT, 11)
+    
+    zeilen = [(y_pos, zeile_info) for y_pos, zeile_info in eintraege if zeile_info != ""]
+    if not zeilen:
+        return
+    
+    t = c.beginText(left_margin, zeilen[0][0])
+    t.setFont(SCHRIFT, 11, line_height)
+    code = t._code
+    punkte = []
+    x_alt, y_alt = left_margin, zeilen[0][0]
+    wortabstand_alt = 0
+    for y_pos, (zeilen_typ, zeilen_text, wortabstand) in zeilen:
+        x_pos = left_margin
+        if zeilen_typ == 'bullet':
+            x_pos = left_margin + AUFZAEHLUNG_EINZUG
+            punkte.append((left_margin + 0.8*cm + 0.2*cm, y_pos + line_height / 2.8))
+        if x_pos == x_alt and y_pos == y_alt - line_height:
+            code.append('T*')
+        elif (x_pos, y_pos) != (x_alt, y_alt):
+            code.append('%s Td' % fp_str(x_pos - x_alt, y_pos - y_alt))
+        x_alt, y_alt = x_pos, y_pos
+        if wortabstand != wortabstand_alt:
+            code.append('%s Tw' % fp_str(wortabstand))
+            wortabstand_alt = wortabstand
+        code.append(t._formatText(zeilen_text))
+    if wortabstand_alt:
+        code.append('0 Tw')
+    c.drawText(t)
     
+    if punkte:
+        punkt = hole_vorlage('aufzaehlungspunkt', (), _punkt_zeichnen)
+        registriere_vorlage(c, punkt)
+        name = c._doc.getXObjectName(punkt.name)
+        c._code.extend('q 1 0 0 1 %s cm /%s Do Q' % (fp_str(x_pos, y_pos), name) for x_pos, y_pos in punkte)
+        c._formsinuse.append(punkt.name)
+
+def _punkt_zeichnen(c):
+    # Aufzählungspunkt um den Ursprung; die Box reicht bis über die Kontur
+    radius = 0.07 * cm
+    c.setFillColorRGB(0, 0, 0)
+    c.circle(0, 0, radius, fill=1)
+    rand = radius + 1
+    return (-rand, -rand, rand, rand), 0, ()
+
+def zeichne_brief(c, daten, layout=None, nur_seite=None, seiten_inhalt=None):
+    # Zeichnet einen vollständigen Brief ab der aktuellen Seite des Canvas.
+    # Seitenzahlen zählen pro Brief, auch wenn mehrere Briefe in einem
+    # Dokument landen (Serienbrief). Mit nur_seite wird nur diese Seite
+    # gezeichnet (Vorschau). seiten_inhalt: Seite -> Vorlage mit dem schon
+    # in einem Worker gezeichneten Seitentext. Liefert die Seitenzahl des Briefs.
+    breite, hoehe = A4
+    profil = ausgabe_profil(daten)
+    mandant = hole_mandant(daten.get('mandant'))
+    layout = layout or brief_layout(daten)
+    
+    @messe('kopfzeile')
     def zeichne_kopfzeile(c, mit_adresse=True):
         wappen_pfad = daten.get('wappen_pfad')
         hat_wappen = wappen_pfad and os.path.exists(wappen_pfad)
         
         if hat_wappen:
-            wappen_hoehe_pos = hoehe - 3.5*cm
-            wappen_breite = 3*cm
-            
-            try:
-                c.drawImage(wappen_pfad, 
-                           (breite - wappen_breite) / 2, wappen_hoehe_pos,
-                           width=wappen_breite, height=wappen_breite,
-                           preserveAspectRatio=True,
-                           mask='auto')
-            except:
-                pass
-            
-            linie_y = wappen_hoehe_pos + (wappen_breite / 2)
-            
-            linke_linie_start = 1*cm
-            linke_linie_ende = (breite - wappen_breite) / 2 - 0.5*cm
-            c.line(linke_linie_start, linie_y, linke_linie_ende, linie_y)
-            
-            rechte_linie_start = (breite + wappen_breite) / 2 + 0.5*cm
-            rechte_linie_ende = breite - 1*cm
-            c.line(rechte_linie_start, linie_y, rechte_linie_ende, linie_y)
-            
-            # PERSÖNLICHE DATEN - Familienname ändern:
-            c.setFont("Helvetica-Bold", 11)
-            familie_text = "Familie " + config.FAMILIENNAME
-            text_breite_familie = c.stringWidth(familie_text, "Helvetica-Bold", 11)
-            c.drawString(rechte_linie_ende - text_breite_familie, linie_y + 0.3*cm, familie_text)
+            zeichne_briefkopf(c, wappen_pfad, profil, mandant)
         
         if mit_adresse:
             anschrift_x = 2.5*cm
             anschrift_y_start = hoehe - 4.8*cm
             
-            c.setFont("Helvetica", 8)
+            c.setFont(SCHRIFT, 8)
             absender_zeile = f"{daten['absender']['name']}, {daten['absender']['strasse']}, {daten['absender']['plz_ort']}"
             c.drawString(anschrift_x, anschrift_y_start, absender_zeile)
             
-            c.setFont("Helvetica", 11)
+            c.setFont(SCHRIFT, 11)
             y_pos = anschrift_y_start - 0.6*cm
             
             if daten['empfaenger'].get('anrede'):
@@ -591,243 +1963,472 @@ def erstelle_brief_pdf(daten):
             # PERSÖNLICHE DATEN - Ort im Datum ändern:
             datum_y = hoehe - 9*cm
             heute = date.today().strftime("%d.%m.%Y")
-            datum_text = config.ORT + ", den " + heute
-            datum_breite = c.stringWidth(datum_text, "Helvetica", 11)
+            datum_text = mandant.ort + ", den " + heute
+            datum_breite = c.stringWidth(datum_text, SCHRIFT, 11)
             c.drawString(breite - 2.5*cm - datum_breite, datum_y, datum_text)
             
-            betreff_y = hoehe - 11*cm
-            c.setFont("Helvetica-Bold", 12)
-
-            betreff_max_width = breite - 5*cm
-            betreff_text = daten['betreff']
-            betreff_woerter = betreff_text.split()
-            betreff_zeilen = []
-            aktuelle_zeile = ""
-
-            for wort in betreff_woerter:
-                test_zeile = aktuelle_zeile + " " + wort if aktuelle_zeile else wort
-                if stringWidth(test_zeile, "Helvetica-Bold", 12) <= betreff_max_width:
-                    aktuelle_zeile = test_zeile
-                else:
-                    if aktuelle_zeile:
-                        betreff_zeilen.append(aktuelle_zeile)
-                    aktuelle_zeile = wort
-
-            if aktuelle_zeile:
-                betreff_zeilen.append(aktuelle_zeile)
-
-            for zeile in betreff_zeilen:
+            c.setFont(SCHRIFT_FETT, 12)
+            for betreff_y, zeile in layout.betreff:
                 c.drawString(2.5*cm, betreff_y, zeile)
-                betreff_y -= 0.5*cm
 
-            anrede_y = betreff_y - 0.5*cm
-            c.setFont("Helvetica", 11)
-            c.drawString(2.5*cm, anrede_y, daten['anrede'])
-
-            return anrede_y - 1*cm
-        else:
-            return hoehe - 5*cm
+            c.setFont(SCHRIFT, 11)
+            c.drawString(2.5*cm, layout.anrede_y, daten['anrede'])
     
-    y_pos = zeichne_kopfzeile(c, mit_adresse=True)
-    zeichne_fusszeile(c, c.getPageNumber(), breite, hoehe)
-    
-    c.setFont("Helvetica", 11)
     left_margin = 2.5*cm
-    right_margin = breite - 2.5*cm
-    max_width = right_margin - left_margin
-    line_height = 0.5*cm
-    
-    def text_in_zeilen_aufteilen(text, font, font_size, max_width):
-        zeilen = []
-        absaetze = text.split('\n')
-        
-        for i, absatz in enumerate(absaetze):
-            if i > 0:
-                zeilen.append("")
-            
-            if not absatz.strip():
-                continue
-            
-            stripped = absatz.strip()
-            is_bullet = stripped.startswith(("•", "-", "*"))
-            if is_bullet:
-                absatz = stripped[1:].strip()
-            
-            woerter = absatz.split()
-            aktuelle_zeile = ""
-            
-            for wort in woerter:
-                test_zeile = aktuelle_zeile + " " + wort if aktuelle_zeile else wort
-                if stringWidth(test_zeile, font, font_size) <= max_width:
-                    aktuelle_zeile = test_zeile
-                else:
-                    if aktuelle_zeile:
-                        zeilen.append(('bullet' if is_bullet else 'normal', aktuelle_zeile))
-                        is_bullet = False
-                    aktuelle_zeile = wort
-            
-            if aktuelle_zeile:
-                zeilen.append(('bullet' if is_bullet else 'normal', aktuelle_zeile))
-        
-        return zeilen
-    
-    zeilen = text_in_zeilen_aufteilen(brieftext, "Helvetica", 11, max_width)
     
-    for zeile_info in zeilen:
-        if y_pos < 4*cm:
-            c.showPage()
-            y_pos = zeichne_kopfzeile(c, mit_adresse=False)
-            zeichne_fusszeile(c, c.getPageNumber(), breite, hoehe)
-            c.setFont("Helvetica", 11)
-        
-        if zeile_info == "":
-            y_pos -= line_height
+    for seite, eintraege in enumerate(layout.seiten, 1):
+        if nur_seite and seite != nur_seite:
             continue
-        
-        zeilen_typ, zeilen_text = zeile_info
-        
-        if zeilen_typ == 'bullet':
-            einrueckung = 0.8 * cm
-            c.setFillColorRGB(0, 0, 0)
-            bullet_radius = 0.07 * cm
-            bullet_offset_x = 0.2 * cm
-            bullet_offset_y = line_height / 2.8
-            c.circle(left_margin + einrueckung + bullet_offset_x, y_pos + bullet_offset_y, bullet_radius, fill=1)
-            c.drawString(left_margin + einrueckung + 0.5*cm, y_pos, zeilen_text)
+        if seite > 1 and not nur_seite:
+            c.showPage()
+        zeichne_kopfzeile(c, mit_adresse=(seite == 1))
+        vorlage = seiten_inhalt.get(seite) if seiten_inhalt else None
+        if vorlage:
+            setze_vorlage(c, vorlage)
+            c.setFont(SCHRIFT, 11)
         else:
-            c.drawString(left_margin, y_pos, zeilen_text)
-        y_pos -= line_height
+            zeichne_seitentext(c, eintraege, seite, len(layout.seiten))
     
-    if y_pos < 5*cm:
-        c.showPage()
-        y_pos = zeichne_kopfzeile(c, mit_adresse=False)
-        zeichne_fusszeile(c, c.getPageNumber(), breite, hoehe)
-        c.setFont("Helvetica", 11)
+    if nur_seite and nur_seite != len(layout.seiten):
+        return len(layout.seiten)
 
-    y_pos -= 1*cm
+    y_pos = layout.schluss_y - 1*cm
     c.drawString(left_margin, y_pos, daten.get('grußformel', 'Mit freundlichen Grüßen,'))
     y_pos -= 0.5*cm
     
     absender_auswahl = daten['absender'].get('auswahl', 's')
     
-    # PERSÖNLICHE DATEN - Unterschriftsdateien anpassen. Vielleicht Pfade ändern:
-    if absender_auswahl == 'b':
-        unterschrift_sophia = STATIC_DIR / config.DATEI_UNTERSCHRIFT_1
-        unterschrift_conrad = STATIC_DIR / config.DATEI_UNTERSCHRIFT_2
-        
-        unterschrift_hoehe = 2.5*cm
-        unterschrift_breite = 5*cm
-        y_pos -= 2.2*cm
-        
-        if unterschrift_sophia.exists():
+    zeichne_unterschriften(c, absender_auswahl, daten['absender']['name'], y_pos, profil, mandant)
+    return len(layout.seiten)
+
+def vorwaermen(mandant=None):
+    # Bilder dekodieren, Vorlagen aufnehmen und Wortbreiten-Cache anlegen,
+    # bevor der erste Brief kommt. Weitere Mandanten werden erst bei Bedarf
+    # geladen, damit nicht alle gleichzeitig im Speicher liegen.
+    mandant = mandant or _standard_mandant
+    for pfad in (mandant.wappen_farbe, mandant.wappen_sw) + mandant.unterschriften:
+        try:
+            lade_bild(pfad)
+        except Exception:
+            pass
+    for font in (SCHRIFT, SCHRIFT_FETT):
+        wortbreiten([" "], font)
+    try:
+        # Je Profil: Vorlagen samt verkleinerten Bildvarianten
+        for profil in AUSGABE_PROFILE.values():
+            for wappen_pfad in (mandant.wappen_farbe, mandant.wappen_sw):
+                zeichne_briefkopf(neuer_canvas(io.BytesIO(), profil), wappen_pfad, profil, mandant)
+            for auswahl in ('s', 'c', 'b'):
+                daten = baue_daten({'absender': auswahl, 'mandant': mandant.name})
+                hole_vorlage('unterschriften', mandant.unterschriften, _unterschriften_zeichnen,
+                             auswahl, daten['absender']['name'], mandant, profil)
+    except Exception:
+        pass
+
+class RenderPoolVoll(Exception):
+    pass
+
+_render_pool = None
+_render_pool_plaetze = None
+_render_pool_lock = threading.Lock()
+_im_render_worker = False
+
+def _render_worker_start():
+    global _im_render_worker
+    _im_render_worker = True
+    vorwaermen()
+
+# Ergebnisse über STREAM_SPEICHER_GRENZE gehen nicht als Bytes durch die
+# Pipe: der Worker schreibt sie in eine temporäre Datei und meldet nur den Pfad.
+GrosseAusgabe = namedtuple('GrosseAusgabe', 'pfad')
+
+def _render_aufgabe(funktion, args):
+    _messung.aufzeichnung = []
+    try:
+        ergebnis = funktion(*args)
+        if hasattr(ergebnis, 'read'):
+            ergebnis = _aus_worker(ergebnis)
+        return ergebnis, _messung.aufzeichnung
+    finally:
+        _messung.aufzeichnung = None
+
+def _aus_worker(puffer):
+    if puffer.seek(0, io.SEEK_END) <= STREAM_SPEICHER_GRENZE:
+        return lies_puffer(puffer)
+    puffer.seek(0)
+    with tempfile.NamedTemporaryFile(prefix='brief_', suffix='.tmp', delete=False) as datei:
+        shutil.copyfileobj(puffer, datei)
+    return GrosseAusgabe(datei.name)
+
+def _als_puffer(ergebnis):
+    if isinstance(ergebnis, GrosseAusgabe):
+        # Die Datei bleibt über den offenen Handle lesbar.
+        datei = open(ergebnis.pfad, 'rb')
+        os.unlink(ergebnis.pfad)
+        return datei
+    return io.BytesIO(ergebnis)
+
+def _als_bytes(ergebnis):
+    if isinstance(ergebnis, GrosseAusgabe):
+        with _als_puffer(ergebnis) as datei:
+            return datei.read()
+    return ergebnis
+
+def _ausgabe_verwerfen(future):
+    # Temporäre Datei eines Ergebnisses löschen, das niemand mehr abholt.
+    if future.cancelled() or future.exception() is not None:
+        return
+    ergebnis = future.result()[0]
+    if isinstance(ergebnis, GrosseAusgabe):
+        try:
+            os.unlink(ergebnis.pfad)
+        except OSError:
+            pass
+
+def render_pool():
+    global _render_pool, _render_pool_plaetze
+    if RENDER_POOL_WORKER <= 0 or _im_render_worker:
+        return None
+    with _render_pool_lock:
+        if _render_pool is None:
+            # Nicht per fork starten: der Pool entsteht erst beim ersten Brief,
+            # wenn schon Request- und Auftrags-Threads laufen. Ein geforktes
+            # Kind könnte eine Sperre (Caches, Logging) geerbt haben, die
+            # keiner mehr freigibt, und bliebe in vorwaermen() hängen.
+            methode = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _render_pool = ProcessPoolExecutor(max_workers=RENDER_POOL_WORKER,
+                                               mp_context=multiprocessing.get_context(methode),
+                                               initializer=_render_worker_start)
+            _render_pool_plaetze = threading.BoundedSemaphore(RENDER_POOL_WORKER + RENDER_POOL_WARTESCHLANGE)
+        return _render_pool
+
+def _render_pool_verwerfen(pool):
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is pool:
+            _render_pool = None
+    pool.shutdown(wait=False)
+
+@atexit.register
+def _render_pool_beenden():
+    if _render_pool is not None:
+        _render_pool.shutdown(wait=False)
+
+def _im_pool(pool, auftraege):
+    # Ein Request belegt einen Platz in der Warteschlange, bis alle seine
+    # Aufträge fertig sind – auch nach einem Timeout, denn laufende Prozesse
+    # lassen sich nicht abbrechen.
+    if not auftraege:
+        return iter(())
+    plaetze = _render_pool_plaetze
+    if not plaetze.acquire(blocking=False):
+        raise RenderPoolVoll()
+    try:
+        futures = [pool.submit(_render_aufgabe, funktion, args) for funktion, args in auftraege]
+    except BrokenProcessPool:
+        plaetze.release()
+        _render_pool_verwerfen(pool)
+        raise
+
+    offen = [len(futures)]
+    offen_lock = threading.Lock()
+    def fertig(future):
+        with offen_lock:
+            offen[0] -= 1
+            if offen[0] == 0:
+                plaetze.release()
+    for future in futures:
+        future.add_done_callback(fertig)
+
+    return _ergebnisse(pool, futures)
+
+def _ergebnisse(pool, futures):
+    abgeholt = 0
+    try:
+        for future in futures:
+            pdf, aufzeichnung = future.result(timeout=RENDER_POOL_TIMEOUT)
+            abgeholt += 1
+            uebernimm_aufzeichnung(aufzeichnung)
+            yield pdf
+    except BrokenProcessPool:
+        _render_pool_verwerfen(pool)
+        raise
+    finally:
+        # Nach Timeout oder abgebrochenem Download keine weiteren Aufträge
+        # dieses Requests mehr starten.
+        for future in futures[abgeholt:]:
+            future.cancel()
+            future.add_done_callback(_ausgabe_verwerfen)
+
+def rendere(funktion, *args):
+    pool = render_pool()
+    if pool is None:
+        return funktion(*args)
+    return _als_puffer(next(_im_pool(pool, [(funktion, args)])))
+
+def rendere_alle(funktion, argument_liste):
+    # Viele Einzel-PDFs (z.B. Serienbrief als ZIP) auf alle Worker verteilen.
+    # Die Aufträge werden sofort angenommen oder abgelehnt, die Ergebnisse
+    # kommen als Iterator in der Reihenfolge der Argumente.
+    pool = render_pool()
+    if pool is None:
+        return (lies_puffer(funktion(*args)) for args in argument_liste)
+    return map(_als_bytes, _im_pool(pool, [(funktion, args) for args in argument_liste]))
+
+# Seitenweise verteilen: Bei sehr langen Briefen zeichnen die Worker den
+# Seitentext (Zeilen und Fußzeile) ihrer Seiten als Vorlagen; der Prozess
+# mit dem Request setzt Briefkopf, diese Vorlagen und den Schluss zu einem
+# PDF zusammen. Schriften und Bilder stehen dabei nur einmal im Dokument.
+def rendere_brief(daten):
+    if SEITEN_PARALLEL_AB and render_pool() is not None:
+        layout = brief_layout(daten)
+        if len(layout.seiten) >= SEITEN_PARALLEL_AB:
+            return erstelle_brief_pdf(daten, layout, verteilen=True)
+    return rendere(erstelle_brief_pdf, daten)
+
+def _schrift_zuordnungen(c, layout):
+    # TrueType: alle Zeichen des Seitentexts vorab in die gemeinsame
+    # Teilschrift aufnehmen, damit Worker und Dokument dieselben Codes
+    # verwenden. None, wenn nicht alles hineinpasst.
+    from reportlab.pdfbase.pdfmetrics import getFont
+    schrift = getFont(SCHRIFT)
+    if not getattr(schrift, '_dynamicFont', False):
+        return {}
+    text = "Seite von 0123456789" + "".join(zeile_info[1] for eintraege in layout.seiten
+                                              for _, zeile_info in eintraege if zeile_info)
+    zustand = schrift._abgleichen(c._doc, text)
+    if len(zustand.subsets) > 1 or not zustand.assignments.keys() >= set(map(ord, text)):
+        return None
+    return {SCHRIFT: (dict(zustand.assignments), list(zustand.subsets[0]), zustand.nextCode)}
+
+def seiten_aufnehmen(daten, layout, von, bis, zuordnungen):
+    # Im Worker: Seitentext der Seiten von..bis, je Seite eine Vorlage (oder
+    # None, wenn eine TrueType-Schrift doch neue Zeichen brauchte)
+    from reportlab.pdfbase import pdfdoc
+    from reportlab.pdfbase.pdfmetrics import getFont
+    breite, hoehe = A4
+    c = neuer_canvas(io.BytesIO(), ausgabe_profil(daten))
+    for ps, (zuordnung, teilschrift, naechster_code) in zuordnungen.items():
+        zustand = getFont(ps)._assignState(c._doc)
+        zustand.assignments = dict(zuordnung)
+        zustand.subsets = [list(teilschrift)]
+        zustand.nextCode = naechster_code
+    
+    seiten = {}
+    punkt = hole_vorlage('aufzaehlungspunkt', (), _punkt_zeichnen)
+    for seite in range(von, bis + 1):
+        c._code = []
+        c._formsinuse = []
+        zeichne_seitentext(c, layout.seiten[seite - 1], seite, len(layout.seiten))
+        schriften, teilbar = vorlagen_schriften(c._doc)
+        for ps, (zuordnung, _, _) in zuordnungen.items():
+            teilbar = teilbar and len(getFont(ps)._assignState(c._doc).assignments) == len(zuordnung)
+        if not teilbar:
+            seiten[seite] = None
+            continue
+        stream = pdfdoc.pdfdocEnc("\n".join(c._code))
+        name = "Seite_" + hashlib.md5(stream + repr(sorted(schriften.items())).encode('utf-8')).hexdigest()
+        bilder = (punkt,) if punkt.name in c._formsinuse else ()
+        seiten[seite] = Vorlage(name, stream, schriften, bilder, (0, 0, breite, hoehe), (0, 0))
+    return seiten
+
+@messe('verteilen')
+def seiten_verteilen(c, daten, layout):
+    pool = render_pool()
+    zuordnungen = _schrift_zuordnungen(c, layout)
+    if pool is None or zuordnungen is None:
+        return None
+    anzahl = len(layout.seiten)
+    teile = min(RENDER_POOL_WORKER, anzahl)
+    grenzen = [anzahl * i // teile for i in range(teile + 1)]
+    seiten_inhalt = {}
+    for teil in _im_pool(pool, [(seiten_aufnehmen, (daten, layout, grenzen[i] + 1, grenzen[i + 1], zuordnungen))
+                                for i in range(teile)]):
+        seiten_inhalt.update(teil)
+    return seiten_inhalt
+
+class ErgebnisCache:
+    # Fertige PDFs nach Inhalts-Hash: LRU im Speicher mit Obergrenze in Bytes,
+    # optional zusätzlich als Dateien in einem Ordner (überlebt Neustarts).
+    def __init__(self, max_bytes, ordner=None):
+        self.max_bytes = max_bytes
+        self.ordner = BASE_DIR / ordner if ordner else None
+        self.eintraege = OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.aufgeraeumt_am = None
+        if self.ordner:
+            self.ordner.mkdir(parents=True, exist_ok=True)
+
+    def get(self, schluessel):
+        with self.lock:
+            pdf = self.eintraege.get(schluessel)
+            if pdf is not None:
+                self.eintraege.move_to_end(schluessel)
+                return pdf
+        if self.ordner:
             try:
-                c.drawImage(
-                    str(unterschrift_sophia),
-                    left_margin,
-                    y_pos,
-                    width=unterschrift_breite,
-                    height=unterschrift_hoehe,
-                    preserveAspectRatio=True,
-                    mask='auto'
-                )
-            except:
-                pass
-        
-        rechte_position = breite / 2 + 1*cm
-        if unterschrift_conrad.exists():
+                pdf = (self.ordner / f"{schluessel}.pdf").read_bytes()
+            except OSError:
+                return None
+            self._im_speicher(schluessel, pdf)
+            return pdf
+        return None
+
+    def put(self, schluessel, pdf):
+        self._im_speicher(schluessel, pdf)
+        if self.ordner:
+            self._aufraeumen()
+            ziel = self.ordner / f"{schluessel}.pdf"
+            tmp = ziel.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
             try:
-                c.drawImage(
-                    str(unterschrift_conrad),
-                    rechte_position,
-                    y_pos,
-                    width=unterschrift_breite,
-                    height=unterschrift_hoehe,
-                    preserveAspectRatio=True,
-                    mask='auto'
-                )
-            except:
+                tmp.write_bytes(pdf)
+                os.replace(tmp, ziel)
+            except OSError:
                 pass
-        
-        y_pos -= 0.5*cm
-        c.drawString(left_margin, y_pos, config.ABSENDER_VORNAME_1 + " " + config.ABSENDER_NACHNAME_1)
-        c.drawString(rechte_position, y_pos, config.ABSENDER_VORNAME_2 + " " + config.ABSENDER_NACHNAME_2)
-    
-    else:
-        unterschrift_datei = None
-        if absender_auswahl == 's':
-            unterschrift_datei = STATIC_DIR / config.DATEI_UNTERSCHRIFT_1
-        elif absender_auswahl == 'c':
-            unterschrift_datei = STATIC_DIR / config.DATEI_UNTERSCHRIFT_2
-        
-        if unterschrift_datei and unterschrift_datei.exists():
+
+    def _im_speicher(self, schluessel, pdf):
+        if len(pdf) > self.max_bytes:
+            return
+        with self.lock:
+            alt = self.eintraege.pop(schluessel, None)
+            if alt is not None:
+                self.bytes -= len(alt)
+            self.eintraege[schluessel] = pdf
+            self.bytes += len(pdf)
+            while self.bytes > self.max_bytes:
+                _, verdraengt = self.eintraege.popitem(last=False)
+                self.bytes -= len(verdraengt)
+
+    def _aufraeumen(self):
+        # Das Datum gehört zum Schlüssel, ältere Dateien werden nie wieder getroffen.
+        heute = date.today()
+        if self.aufgeraeumt_am == heute:
+            return
+        self.aufgeraeumt_am = heute
+        for datei in self.ordner.glob("*.pdf"):
             try:
-                unterschrift_hoehe = 2.5*cm
-                unterschrift_breite = 5*cm
-                y_pos -= 2.2*cm
-                c.drawImage(
-                    str(unterschrift_datei),
-                    left_margin,
-                    y_pos,
-                    width=unterschrift_breite,
-                    height=unterschrift_hoehe,
-                    preserveAspectRatio=True,
-                    mask='auto'
-                )
-                y_pos -= 0.5*cm
-            except:
+                if date.fromtimestamp(datei.stat().st_mtime) < heute:
+                    datei.unlink()
+            except OSError:
                 pass
-        else:
-            y_pos -= 2*cm
-        
-        c.drawString(left_margin, y_pos, daten['absender']['name'])
-    
-    c.save()
-    buffer.seek(0)
-    return buffer
+
+ergebnis_cache = ErgebnisCache(ERGEBNIS_CACHE_BYTES, ERGEBNIS_CACHE_ORDNER)
+_APP_STAND = os.stat(__file__).st_mtime_ns
+# Alle Einstellungen aus config.py (Schriften, Profile, Blocksatz, ...) gehen
+# in den Schlüssel ein; sie werden nur beim Start gelesen.
+_CONFIG_STAND = hashlib.sha256(json.dumps(
+    {name: getattr(config, name) for name in dir(config) if name.isupper()},
+    sort_keys=True, ensure_ascii=False, default=repr).encode('utf-8')).hexdigest()
+
+def ergebnis_schluessel(daten):
+    # Alles, was das PDF beeinflusst: Formulardaten, Stand der Bilder und des
+    # Programms, Konfiguration und das Datum im Briefkopf.
+    mandant = hole_mandant(daten.get('mandant'))
+    bilder = [daten.get('wappen_pfad'), *mandant.unterschriften,
+              *(BASE_DIR / pfad for pfad in (TTF_SCHRIFT, TTF_SCHRIFT_FETT) if pfad)]
+    staende = []
+    for pfad in bilder:
+        try:
+            st = os.stat(pfad) if pfad else None
+        except OSError:
+            st = None
+        staende.append((st.st_mtime_ns, st.st_size) if st else None)
+    inhalt = json.dumps({
+        'daten': daten,
+        'bilder': staende,
+        'app': _APP_STAND,
+        'config': [_CONFIG_STAND, mandant.name, mandant.stand, mandant.familienname, mandant.vorname_1, mandant.nachname_1,
+                   mandant.vorname_2, mandant.nachname_2, mandant.ort],
+        'datum': date.today().isoformat(),
+    }, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(inhalt.encode('utf-8')).hexdigest()
+
+# Startseite: Template einmal kompilieren, fertiges HTML je Mandant bis zur
+# nächsten Änderung an den Logos wiederverwenden. Die Logos selbst kommen über
+# eine URL mit Fingerabdruck und dürfen daher unbegrenzt gecacht werden.
+_index_html = LRUCache(64)
+
+@lru_cache(maxsize=1)
+def index_template():
+    return app.jinja_env.from_string(HTML_TEMPLATE)
 
 @app.route('/')
 def index():
-    wappen_farbe_b64 = get_wappen_base64(WAPPEN_FARBE)
-    wappen_sw_b64 = get_wappen_base64(WAPPEN_SW)
-    
-    return render_template_string(
-        HTML_TEMPLATE,
-        wappen_base64=wappen_farbe_b64,
-        wappen_farbe_base64=wappen_farbe_b64,
-        wappen_sw_base64=wappen_sw_b64,
-        familienname=config.FAMILIENNAME,
-        vorname_1=config.ABSENDER_VORNAME_1,
-        vorname_2=config.ABSENDER_VORNAME_2,
-        nachname_1=config.ABSENDER_NACHNAME_1,
-        nachname_2=config.ABSENDER_NACHNAME_2
-    )
+    try:
+        mandant = hole_mandant(request.args.get('mandant'))
+    except UnbekannterMandant:
+        abort(404)
+    abdruecke = {art: logo_fingerabdruck(pfad) for art, pfad in logos(mandant).items()}
+    schluessel = (mandant.name, mandant.stand, tuple(sorted(abdruecke.items())))
+    eintrag = _index_html.get(schluessel)
+    
+    if eintrag is None:
+        extra = {} if mandant is _standard_mandant else {'mandant': mandant.name}
+        urls = {art: url_for('logo', art=art, fingerabdruck=fp, **extra) if fp else None
+                for art, fp in abdruecke.items()}
+        html = index_template().render(
+            wappen_url=urls['farbe'],
+            wappen_farbe_url=urls['farbe'],
+            wappen_sw_url=urls['sw'],
+            mandant=mandant.name,
+            familienname=mandant.familienname,
+            vorname_1=mandant.vorname_1,
+            vorname_2=mandant.vorname_2,
+            nachname_1=mandant.nachname_1,
+            nachname_2=mandant.nachname_2,
+            blocksatz=BLOCKSATZ,
+            profil=AUSGABE_PROFIL
+        )
+        eintrag = (html, hashlib.md5(html.encode('utf-8')).hexdigest())
+        _index_html.entferne(lambda k: k[0] == mandant.name)
+        _index_html.put(schluessel, eintrag)
+    
+    html, etag = eintrag
+    antwort = Response(html, mimetype='text/html')
+    antwort.set_etag(etag)
+    antwort.headers['Cache-Control'] = 'no-cache'
+    return antwort.make_conditional(request)
 
-@app.route('/generate', methods=['POST'])
-def generate():
-    logo_auswahl = request.form.get('logo')
+@app.route('/logo/<art>.<fingerabdruck>.png')
+def logo(art, fingerabdruck):
+    try:
+        mandant = hole_mandant(request.args.get('mandant'))
+    except UnbekannterMandant:
+        abort(404)
+    pfad = logos(mandant).get(art)
+    if pfad is None or logo_fingerabdruck(pfad) != fingerabdruck:
+        abort(404)
+    antwort = send_file(pfad, mimetype='image/png')
+    antwort.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return antwort
+
+def baue_daten(formular, platzhalter_pflicht=True):
+    mandant = hole_mandant(formular.get('mandant'))
+    logo_auswahl = formular.get('logo')
     if logo_auswahl == '1':
-        wappen_pfad = str(WAPPEN_FARBE)
+        wappen_pfad = str(mandant.wappen_farbe)
     elif logo_auswahl == '2':
-        wappen_pfad = str(WAPPEN_SW)
+        wappen_pfad = str(mandant.wappen_sw)
     else:
         wappen_pfad = None
     
     # PERSÖNLICHE DATEN - Namen der Absender anpassen:
-    absender_auswahl = request.form.get('absender')
+    absender_auswahl = formular.get('absender')
     if absender_auswahl == 's':
-        absender_name = config.ABSENDER_VORNAME_1 + " " + config.ABSENDER_NACHNAME_1
+        absender_name = mandant.vorname_1 + " " + mandant.nachname_1
     elif absender_auswahl == 'c':
-        absender_name = config.ABSENDER_VORNAME_2 + " " + config.ABSENDER_NACHNAME_2
+        absender_name = mandant.vorname_2 + " " + mandant.nachname_2
     else:
-        absender_name = f"{config.ABSENDER_VORNAME_1} {config.ABSENDER_NACHNAME_1} und {config.ABSENDER_VORNAME_2} {config.ABSENDER_NACHNAME_2}"
+        absender_name = f"{mandant.vorname_1} {mandant.nachname_1} und {mandant.vorname_2} {mandant.nachname_2}"
     
-    anrede_manuell = request.form.get('anrede', '').strip()
+    anrede_manuell = formular.get('anrede', '').strip()
     
     if anrede_manuell:
         anrede = anrede_manuell
     else:
-        emp_anrede = request.form.get('emp_anrede', '')
-        emp_name = request.form.get('emp_name', '')
+        emp_anrede = formular.get('emp_anrede', '')
+        emp_name = formular.get('emp_name', '')
         
         if emp_anrede == 'Herr':
             nachname = emp_name.split()[-1] if emp_name else ''
@@ -838,43 +2439,865 @@ def generate():
         else:
             anrede = "Sehr geehrte Damen und Herren,"
     
-    grußformel = request.form.get('grußformel', '').strip()
+    grußformel = formular.get('grußformel', '').strip()
     if not grußformel:
         grußformel = "Mit freundlichen Grüßen,"
 
+    ausrichtung = formular.get('ausrichtung') or ('blocksatz' if BLOCKSATZ else 'links')
+    profil = formular.get('profil') or AUSGABE_PROFIL
+    if profil not in AUSGABE_PROFILE:
+        profil = 'archiv'
+
+    betreff = formular.get('betreff')
+    brieftext = formular.get('brieftext')
+    muster = None
+    if formular.get('muster'):
+        muster = hole_muster(formular['muster'])
+        werte = muster_werte(formular, muster, platzhalter_pflicht)
+        brieftext = muster.brieftext(werte)
+        if not betreff:
+            betreff = muster.einsetzen(muster.betreff, werte)
+
     daten = {
         'absender': {
             'name': absender_name,
-            'strasse': ABSENDER_STRASSE,
-            'plz_ort': ABSENDER_PLZ_ORT,
+            'strasse': mandant.strasse,
+            'plz_ort': mandant.plz_ort,
             'auswahl': absender_auswahl
         },
         'empfaenger': {
-            'anrede': request.form.get('emp_anrede', ''),
-            'name': request.form.get('emp_name'),
-            'strasse': request.form.get('emp_strasse'),
-            'plz_ort': request.form.get('emp_plz_ort')
+            'anrede': formular.get('emp_anrede', ''),
+            'name': formular.get('emp_name'),
+            'strasse': formular.get('emp_strasse'),
+            'plz_ort': formular.get('emp_plz_ort')
         },
         'anrede': anrede,
-        'betreff': request.form.get('betreff'),
-        'brieftext': request.form.get('brieftext'),
+        'betreff': betreff,
+        'brieftext': brieftext,
         'grußformel': grußformel,
+        'blocksatz': ausrichtung == 'blocksatz',
+        'profil': profil,
+        'mandant': mandant.name,
         'wappen_pfad': wappen_pfad
     }
+    if muster:
+        daten['muster'] = muster.name
+        daten['werte'] = werte
+    return daten
+
+# Serienbrief: gemeinsamer Brief, Empfängerliste als CSV oder JSONL
+EMPFAENGER_FELDER = ('emp_name', 'emp_strasse', 'emp_plz_ort', 'emp_anrede', 'anrede')
+EMPFAENGER_PFLICHTFELDER = ('emp_name', 'emp_strasse', 'emp_plz_ort')
+
+def lese_empfaenger(inhalt, dateiname=''):
+    inhalt = inhalt.lstrip('\ufeff')
+    if dateiname.lower().endswith(('.jsonl', '.json')) or inhalt.lstrip().startswith('{'):
+        eintraege = [json.loads(zeile) for zeile in inhalt.splitlines() if zeile.strip()]
+    else:
+        try:
+            dialekt = csv.Sniffer().sniff(inhalt[:4096], delimiters=',;\t')
+        except csv.Error:
+            dialekt = csv.excel
+        eintraege = list(csv.DictReader(io.StringIO(inhalt), dialect=dialekt))
+
+    empfaenger = []
+    for nr, eintrag in enumerate(eintraege, 1):
+        if not isinstance(eintrag, dict):
+            raise ValueError(f"Eintrag {nr} ist kein Objekt")
+        felder = {}
+        for schluessel, wert in eintrag.items():
+            schluessel = (schluessel or '').strip()
+            if wert is None:
+                continue
+            if schluessel in EMPFAENGER_FELDER:
+                felder[schluessel] = str(wert).strip()
+            elif re.fullmatch(r'\w+', schluessel):
+                # Weitere Spalten sind Werte für Platzhalter im Briefmuster
+                felder.setdefault('werte', {})[schluessel] = str(wert).strip()
+        fehlend = [f for f in EMPFAENGER_PFLICHTFELDER if not felder.get(f)]
+        if fehlend:
+            raise ValueError(f"Eintrag {nr}: {', '.join(fehlend)} fehlt")
+        empfaenger.append(felder)
+    return empfaenger
+
+def serienbrief_daten(gemeinsam, empfaenger):
+    # Empfängerfelder aus dem gemeinsamen Formular gelten nicht für die Liste;
+    # eine Anrede in der Liste hat Vorrang vor der gemeinsamen.
+    daten_liste = []
+    basis = {k: v for k, v in gemeinsam.items() if not k.startswith('emp_')}
+    for eintrag in empfaenger:
+        formular = dict(basis)
+        formular.update({k: v for k, v in eintrag.items() if v or k != 'anrede'})
+        daten_liste.append(baue_daten(formular))
+    return daten_liste
+
+def serienbrief_dateiname(nr, daten):
+    name = re.sub(r'[^\w\-]+', '_', daten['empfaenger']['name'] or '').strip('_')
+    return f'brief_{date.today().strftime("%Y%m%d")}_{nr:03d}_{name}.pdf'
+
+def ausgabe_puffer():
+    return tempfile.SpooledTemporaryFile(max_size=STREAM_SPEICHER_GRENZE)
+
+def lies_puffer(puffer):
+    puffer.seek(0)
+    return puffer.read()
+
+def erstelle_serienbrief_pdf(daten_liste):
+    # Ein Canvas für alle Briefe: Briefkopf-Form, Schriften und Bilder werden
+    # nur einmal ins Dokument geschrieben.
+    puffer = ausgabe_puffer()
+    c = neuer_canvas(puffer, ausgabe_profil(daten_liste[0]) if daten_liste else None)
+    for daten in daten_liste:
+        zeichne_brief(c, daten)
+        c.showPage()
+    with messe('speichern'):
+        c.save()
+    puffer.seek(0)
+    return puffer
+
+def schreibe_serienbrief_zip(daten_liste, pdfs, ziel):
+    # Schreibt das ZIP Brief für Brief nach ziel und meldet sich nach jedem
+    # Eintrag, damit fertige Teile sofort weitergereicht werden können.
+    with zipfile.ZipFile(ziel, 'w', zipfile.ZIP_STORED) as archiv:
+        for nr, (daten, pdf) in enumerate(zip(daten_liste, pdfs), 1):
+            archiv.writestr(serienbrief_dateiname(nr, daten), pdf)
+            yield
+    yield
+
+def erstelle_serienbrief_zip(daten_liste):
+    puffer = ausgabe_puffer()
+    pdfs = rendere_alle(erstelle_brief_pdf, [(daten,) for daten in daten_liste])
+    for _ in schreibe_serienbrief_zip(daten_liste, pdfs, puffer):
+        pass
+    puffer.seek(0)
+    return puffer
+
+class _Durchreicher:
+    # Nicht durchsuchbares Ziel für zipfile: sammelt geschriebene Bytes, bis
+    # sie abgeholt werden.
+    def __init__(self):
+        self.teile = []
+
+    def write(self, daten):
+        self.teile.append(bytes(daten))
+        return len(daten)
+
+    def flush(self):
+        pass
+
+    def abholen(self):
+        daten = b''.join(self.teile)
+        self.teile.clear()
+        return daten
+
+def serienbrief_zip_stream(daten_liste, pdfs):
+    senke = _Durchreicher()
+    for _ in schreibe_serienbrief_zip(daten_liste, pdfs, senke):
+        teil = senke.abholen()
+        if teil:
+            yield teil
+
+def sende_puffer(puffer, mimetype, download_name):
+    groesse = puffer.seek(0, io.SEEK_END)
+    puffer.seek(0)
+    antwort = send_file(puffer, mimetype=mimetype, as_attachment=True, download_name=download_name)
+    antwort.content_length = groesse
+    return antwort
+
+# Zugangskontrolle: Größe der Anfrage und des Briefs vor dem Rendern prüfen,
+# Anfragen pro Client drosseln und gleichzeitiges Rendern begrenzen. Wer
+# nicht durchkommt, bekommt sofort eine Antwort statt in einer Schlange zu
+# warten.
+app.config['MAX_CONTENT_LENGTH'] = ANFRAGE_MAX_BYTES
+if VERTRAUTE_PROXYS:
+    from werkzeug.middleware.proxy_fix import ProxyFix
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=VERTRAUTE_PROXYS)
+
+class ZuUmfangreich(Exception):
+    pass
+
+def schaetze_seiten(brieftext):
+    # Ohne Umbruch: etwa 90 Zeichen pro Zeile, 41 Zeilen pro Seite, auf der
+    # ersten Seite wegen Anschrift und Betreff rund 13 Zeilen weniger.
+    absaetze = brieftext.split('\n')
+    zeilen = len(absaetze) - 1 + sum(math.ceil(len(absatz) / 90) for absatz in absaetze)
+    return max(1, math.ceil((zeilen + 13) / 41))
+
+def pruefe_umfang(daten_liste, max_seiten=ANFRAGE_MAX_SEITEN):
+    seiten = 0
+    for daten in daten_liste:
+        brieftext = daten.get('brieftext') or ''
+        if len(brieftext) > BRIEFTEXT_MAX_ZEICHEN:
+            raise ZuUmfangreich(f"Brieftext zu lang (höchstens {BRIEFTEXT_MAX_ZEICHEN} Zeichen)")
+        seiten += schaetze_seiten(brieftext)
+        if max_seiten and seiten > max_seiten:
+            raise ZuUmfangreich(f"Zu viele Seiten (höchstens {max_seiten}), bitte über /jobs erstellen")
+
+class Drossel:
+    # Token-Bucket pro Client: rate Anfragen pro Sekunde, kurzfristig bis zu
+    # burst am Stück. Es werden höchstens max_clients Clients gemerkt; wer am
+    # längsten nichts geschickt hat, fällt zuerst heraus.
+    def __init__(self, rate, burst, max_clients=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.eimer = OrderedDict()
+        self.lock = threading.Lock()
+
+    def nehmen(self, client):
+        # Liefert 0, wenn die Anfrage durchgeht, sonst die Wartezeit in Sekunden
+        jetzt = time.monotonic()
+        with self.lock:
+            tokens, zuletzt = self.eimer.pop(client, (self.burst, jetzt))
+            tokens = min(self.burst, tokens + (jetzt - zuletzt) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wartezeit = 0
+            else:
+                wartezeit = (1 - tokens) / self.rate
+            self.eimer[client] = (tokens, jetzt)
+            if len(self.eimer) > self.max_clients:
+                self.eimer.popitem(last=False)
+        return wartezeit
+
+drossel = Drossel(RATE_LIMIT_PRO_MINUTE / 60, RATE_LIMIT_BURST) if RATE_LIMIT_PRO_MINUTE else None
+vorschau_drossel = Drossel(VORSCHAU_PRO_MINUTE / 60, RATE_LIMIT_BURST) if VORSCHAU_PRO_MINUTE else None
+_render_plaetze = threading.BoundedSemaphore(RENDER_GLEICHZEITIG) if RENDER_GLEICHZEITIG else None
+
+def zu_viele_anfragen(wartezeit, ergebnis):
+    beobachte('brief_anfragen_total', 1, ergebnis=ergebnis)
+    antwort = jsonify({"error": "Zu viele Anfragen, bitte später erneut versuchen"})
+    antwort.status_code = 429
+    antwort.headers['Retry-After'] = str(max(1, math.ceil(wartezeit)))
+    return antwort
+
+def zugang_begrenzen(rendern=True, vorschau=False):
+    # Drosselung pro Client-IP; bei rendern=True zusätzlich ein Platz unter
+    # RENDER_GLEICHZEITIG. Fertige PDFs geben ihn sofort frei; ein ZIP-Stream
+    # rendert erst beim Senden und hält ihn, bis der Server ihn schließt.
+    # Die Vorschau kommt beim Tippen oft und hat ihren eigenen Eimer.
+    def dekorator(route):
+        @functools.wraps(route)
+        def begrenzt(*args, **kwargs):
+            eimer = vorschau_drossel if vorschau else drossel
+            if eimer:
+                wartezeit = eimer.nehmen(request.remote_addr)
+                if wartezeit:
+                    return zu_viele_anfragen(wartezeit, 'gedrosselt')
+            plaetze = _render_plaetze if rendern else None
+            if plaetze and not plaetze.acquire(timeout=RENDER_PLATZ_WARTEZEIT):
+                return zu_viele_anfragen(1, 'ausgelastet')
+            try:
+                antwort = app.make_response(route(*args, **kwargs))
+            except BaseException:
+                if plaetze:
+                    plaetze.release()
+                raise
+            if plaetze:
+                if antwort.is_streamed and not antwort.direct_passthrough:
+                    antwort.response = ClosingIterator(antwort.response, plaetze.release)
+                else:
+                    plaetze.release()
+            return antwort
+        return begrenzt
+    return dekorator
+
+@app.errorhandler(413)
+def anfrage_zu_gross(fehler):
+    beobachte('brief_anfragen_total', 1, ergebnis='zu_gross')
+    return jsonify({"error": f"Anfrage zu groß (höchstens {ANFRAGE_MAX_BYTES} Bytes)"}), 413
+
+@app.route('/generate', methods=['POST'])
+@zugang_begrenzen()
+def generate():
+    try:
+        with messe('formular'):
+            daten = baue_daten(request.form)
+        pruefe_umfang([daten])
+    except (UnbekannterMandant, UnbekanntesMuster) as e:
+        return jsonify({"error": str(e)}), 404
+    except FehlenderPlatzhalter as e:
+        return jsonify({"error": str(e)}), 400
+    except ZuUmfangreich as e:
+        beobachte('brief_anfragen_total', 1, ergebnis='zu_gross')
+        return jsonify({"error": str(e)}), 413
+    absender_auswahl = daten['absender']['auswahl']
+    
+    # Gleiche Formulardaten ergeben am selben Tag dasselbe PDF. Ein POST darf
+    # dafür nicht mit 304 beantwortet werden (RFC 9110, 13.1.2), sondern mit
+    # 412; das PDF selbst gibt es unter Content-Location per GET mit 304.
+    schluessel = ergebnis_schluessel(daten)
+    if schluessel in request.if_none_match:
+        beobachte('brief_anfragen_total', 1, ergebnis='nicht_geaendert')
+        antwort = Response(status=412)
+        antwort.set_etag(schluessel)
+        antwort.headers['Content-Location'] = url_for('ergebnis_pdf', schluessel=schluessel)
+        return antwort
     
     try:
-        pdf_buffer = erstelle_brief_pdf(daten)
+        pdf = ergebnis_cache.get(schluessel)
+        if pdf is None:
+            with messe('gesamt'):
+                pdf = lies_puffer(rendere_brief(daten))
+            ergebnis_cache.put(schluessel, pdf)
+            beobachte('brief_anfragen_total', 1, ergebnis='erstellt')
+        else:
+            beobachte('brief_anfragen_total', 1, ergebnis='cache')
         
-        return send_file(
-            pdf_buffer,
+        dateiname = f'brief_{date.today().strftime("%Y%m%d")}_{absender_auswahl}.pdf'
+        archivieren(daten, pdf, dateiname)
+        antwort = send_file(
+            io.BytesIO(pdf),
             mimetype='application/pdf',
             as_attachment=True,
-            download_name=f'brief_{date.today().strftime("%Y%m%d")}_{absender_auswahl}.pdf'
+            download_name=dateiname
+        )
+        antwort.set_etag(schluessel)
+        antwort.headers['Cache-Control'] = 'private, no-cache'
+        antwort.headers['Content-Location'] = url_for('ergebnis_pdf', schluessel=schluessel)
+        return antwort
+    except RenderPoolVoll:
+        beobachte('brief_anfragen_total', 1, ergebnis='ausgelastet')
+        return jsonify({"error": "Server ausgelastet, bitte später erneut versuchen"}), 503, {'Retry-After': '5'}
+    except concurrent.futures.TimeoutError:
+        beobachte('brief_anfragen_total', 1, ergebnis='timeout')
+        app.logger.warning("Zeitüberschreitung beim Erstellen des PDFs")
+        return jsonify({"error": "Zeitüberschreitung beim Erstellen des PDFs"}), 504
+    except Exception:
+        beobachte('brief_anfragen_total', 1, ergebnis='fehler')
+        app.logger.exception("Fehler beim Erstellen des PDFs")
+        return jsonify({"error": "Fehler beim Erstellen des PDFs"}), 500
+
+@app.route('/generate/<schluessel>.pdf')
+@zugang_begrenzen(rendern=False)
+def ergebnis_pdf(schluessel):
+    # Ein schon erstelltes PDF erneut laden, solange es im Ergebnis-Cache liegt.
+    # Der Schlüssel ist der ETag aus /generate.
+    pdf = ergebnis_cache.get(schluessel) if re.fullmatch(r'[0-9a-f]{64}', schluessel) else None
+    if pdf is None:
+        abort(404)
+    antwort = send_file(io.BytesIO(pdf), mimetype='application/pdf', as_attachment=True,
+                        download_name=f'brief_{schluessel[:12]}.pdf')
+    antwort.set_etag(schluessel)
+    antwort.headers['Cache-Control'] = 'private, no-cache'
+    return antwort.make_conditional(request)
+
+def vorschau_daten(form):
+    # Für Vorschau und /layout: leere Pflichtfelder und fehlende Platzhalter
+    # sind erlaubt, keine Seitengrenze. Liefert (daten, None) oder (None, Fehlerantwort).
+    formular = form.to_dict()
+    for feld in ('betreff', 'brieftext', 'emp_name', 'emp_strasse', 'emp_plz_ort'):
+        formular.setdefault(feld, '')
+    try:
+        daten = baue_daten(formular, platzhalter_pflicht=False)
+        pruefe_umfang([daten], max_seiten=None)
+    except (UnbekannterMandant, UnbekanntesMuster) as e:
+        return None, (jsonify({"error": str(e)}), 404)
+    except ZuUmfangreich as e:
+        return None, (jsonify({"error": str(e)}), 413)
+    return daten, None
+
+@app.route('/preview', methods=['POST'])
+@zugang_begrenzen(vorschau=True)
+def preview():
+    # Vorschau beim Tippen: eine Seite als PDF, ohne Render-Pool und
+    # Ergebnis-Cache. Leere Pflichtfelder sind hier erlaubt.
+    daten, fehler = vorschau_daten(request.form)
+    if fehler:
+        return fehler
+    
+    with messe('vorschau'):
+        pdf, seite, seiten = erstelle_vorschau_pdf(daten, request.form.get('seite', type=int),
+                                                   request.form.get('absatz', 0, type=int))
+    antwort = send_file(pdf, mimetype='application/pdf')
+    antwort.headers['X-Seite'] = str(seite)
+    antwort.headers['X-Seiten'] = str(seiten)
+    antwort.headers['Cache-Control'] = 'no-store'
+    return antwort
+
+@app.route('/layout', methods=['POST'])
+@zugang_begrenzen(rendern=False)
+def trockenlauf():
+    # Trockenlauf: Umbruch und Seitenaufteilung ohne PDF. Zeigt vor dem
+    # Erstellen, wie viele Seiten ein Brief wird und wo jede Zeile steht.
+    daten, fehler = vorschau_daten(request.form)
+    if fehler:
+        return fehler
+    
+    ergebnis = layout_als_dict(brief_layout(daten))
+    ergebnis['max_seiten'] = ANFRAGE_MAX_SEITEN or None
+    return jsonify(ergebnis)
+
+@app.route('/muster')
+def muster_liste():
+    # Verfügbare Briefmuster mit ihren Platzhaltern
+    return jsonify([{'name': muster.name, 'betreff': muster.betreff, 'platzhalter': muster.platzhalter}
+                    for muster in alle_muster()])
+
+def serienbrief_aus_request():
+    datei = request.files.get('empfaenger')
+    try:
+        if datei:
+            empfaenger = lese_empfaenger(datei.read().decode('utf-8-sig'), datei.filename or '')
+        else:
+            empfaenger = lese_empfaenger(request.form.get('empfaenger', ''))
+    except (ValueError, csv.Error) as e:
+        raise ValueError(f"Empfängerliste ungültig: {e}")
+
+    if not empfaenger:
+        raise ValueError("Empfängerliste ist leer")
+    if not request.form.get('muster') and (not request.form.get('betreff') or not request.form.get('brieftext')):
+        raise ValueError("Betreff und Brieftext sind Pflichtfelder")
+
+    return serienbrief_daten(request.form.to_dict(), empfaenger)
+
+@app.route('/generate/batch', methods=['POST'])
+@zugang_begrenzen()
+def generate_batch():
+    try:
+        daten_liste = serienbrief_aus_request()
+        pruefe_umfang(daten_liste)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except ZuUmfangreich as e:
+        beobachte('brief_anfragen_total', 1, ergebnis='zu_gross')
+        return jsonify({"error": str(e)}), 413
+    heute = date.today().strftime("%Y%m%d")
+
+    try:
+        if request.form.get('format') == 'zip':
+            pdfs = rendere_alle(erstelle_brief_pdf, [(daten,) for daten in daten_liste])
+            return Response(
+                serienbrief_zip_stream(daten_liste, pdfs),
+                mimetype='application/zip',
+                headers={'Content-Disposition': f'attachment; filename=briefe_{heute}.zip'}
+            )
+        return sende_puffer(
+            rendere(erstelle_serienbrief_pdf, daten_liste),
+            'application/pdf',
+            f'briefe_{heute}.pdf'
         )
-    except Exception as e:
+    except RenderPoolVoll:
+        beobachte('brief_anfragen_total', 1, ergebnis='ausgelastet')
+        return jsonify({"error": "Server ausgelastet, bitte später erneut versuchen"}), 503, {'Retry-After': '5'}
+    except concurrent.futures.TimeoutError:
+        beobachte('brief_anfragen_total', 1, ergebnis='timeout')
+        app.logger.warning("Zeitüberschreitung beim Erstellen des PDFs")
+        return jsonify({"error": "Zeitüberschreitung beim Erstellen des PDFs"}), 504
+    except Exception:
+        beobachte('brief_anfragen_total', 1, ergebnis='fehler')
+        app.logger.exception("Fehler beim Erstellen des PDFs")
         return jsonify({"error": "Fehler beim Erstellen des PDFs"}), 500
 
+# Auftrags-Warteschlange: Aufträge liegen in SQLite, Worker-Threads holen sie
+# dort ab. Dadurch überleben wartende Aufträge einen Neustart und mehrere
+# Prozesse (z.B. gunicorn-Worker) können sich eine Datenbank teilen.
+_job_lokal = threading.local()
+_job_signal = threading.Event()
+_job_worker_lock = threading.Lock()
+_job_worker = []
+
+def job_db():
+    verbindung = getattr(_job_lokal, 'verbindung', None)
+    if verbindung is None:
+        verbindung = sqlite3.connect(JOB_DATENBANK, timeout=30, isolation_level=None)
+        verbindung.row_factory = sqlite3.Row
+        verbindung.execute("PRAGMA journal_mode=WAL")
+        verbindung.execute("""
+            CREATE TABLE IF NOT EXISTS auftraege (
+                id TEXT PRIMARY KEY,
+                art TEXT NOT NULL,
+                status TEXT NOT NULL,
+                daten TEXT NOT NULL,
+                erstellt REAL NOT NULL,
+                gestartet REAL,
+                fertig REAL,
+                fehler TEXT,
+                dateiname TEXT,
+                mimetype TEXT,
+                ergebnis BLOB
+            )""")
+        verbindung.execute("CREATE INDEX IF NOT EXISTS auftraege_status ON auftraege (status, erstellt)")
+        _job_lokal.verbindung = verbindung
+    return verbindung
+
+def job_anlegen(art, daten, dateiname, mimetype):
+    db = job_db()
+    wartend = db.execute("SELECT COUNT(*) FROM auftraege WHERE status = 'wartend'").fetchone()[0]
+    if wartend >= JOB_WARTESCHLANGE:
+        raise RenderPoolVoll()
+    job_id = uuid.uuid4().hex
+    db.execute(
+        "INSERT INTO auftraege (id, art, status, daten, erstellt, dateiname, mimetype) VALUES (?, ?, 'wartend', ?, ?, ?, ?)",
+        (job_id, art, json.dumps(daten, ensure_ascii=False), time.time(), dateiname, mimetype))
+    _job_signal.set()
+    return job_id
+
+def _job_abholen(db):
+    jetzt = time.time()
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        # Aufträge, deren Worker abgestürzt ist, wieder freigeben
+        db.execute("UPDATE auftraege SET status = 'wartend', gestartet = NULL WHERE status = 'laeuft' AND gestartet < ?",
+                   (jetzt - JOB_LAUFZEIT_MAX,))
+        db.execute("DELETE FROM auftraege WHERE status IN ('fertig', 'fehler') AND fertig < ?", (jetzt - JOB_TTL,))
+        zeile = db.execute("SELECT * FROM auftraege WHERE status = 'wartend' ORDER BY erstellt LIMIT 1").fetchone()
+        if zeile is not None:
+            db.execute("UPDATE auftraege SET status = 'laeuft', gestartet = ? WHERE id = ?", (jetzt, zeile['id']))
+        db.execute("COMMIT")
+    except Exception:
+        db.execute("ROLLBACK")
+        raise
+    return zeile
+
+def _job_ausfuehren(zeile):
+    daten = json.loads(zeile['daten'])
+    if zeile['art'] == 'serienbrief_zip':
+        return erstelle_serienbrief_zip(daten)
+    if zeile['art'] == 'serienbrief':
+        return rendere(erstelle_serienbrief_pdf, daten)
+    pdf = lies_puffer(rendere_brief(daten))
+    archivieren(daten, pdf, zeile['dateiname'])
+    return io.BytesIO(pdf)
+
+def _job_ergebnis_speichern(db, job_id, puffer):
+    groesse = puffer.seek(0, io.SEEK_END)
+    puffer.seek(0)
+    if groesse <= STREAM_SPEICHER_GRENZE or not hasattr(db, 'blobopen'):
+        db.execute("UPDATE auftraege SET status = 'fertig', ergebnis = ?, fertig = ?, daten = '' WHERE id = ?",
+                   (sqlite3.Binary(puffer.read()), time.time(), job_id))
+        return
+    # Große Ergebnisse stückweise in den vorher angelegten BLOB kopieren
+    # (Connection.blobopen, ab Python 3.11).
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        db.execute("UPDATE auftraege SET status = 'fertig', ergebnis = zeroblob(?), fertig = ?, daten = '' WHERE id = ?",
+                   (groesse, time.time(), job_id))
+        zeile = db.execute("SELECT rowid FROM auftraege WHERE id = ?", (job_id,)).fetchone()
+        if zeile is not None:
+            with db.blobopen('auftraege', 'ergebnis', zeile[0]) as blob:
+                shutil.copyfileobj(puffer, blob)
+        db.execute("COMMIT")
+    except Exception:
+        db.execute("ROLLBACK")
+        raise
+
+def _job_worker_schleife():
+    db = job_db()
+    while True:
+        try:
+            zeile = _job_abholen(db)
+        except sqlite3.Error:
+            app.logger.exception("Auftrags-Datenbank nicht erreichbar")
+            time.sleep(5)
+            continue
+        if zeile is None:
+            _job_signal.wait(timeout=2)
+            _job_signal.clear()
+            continue
+
+        try:
+            with _job_ausfuehren(zeile) as ergebnis:
+                _job_ergebnis_speichern(db, zeile['id'], ergebnis)
+        except RenderPoolVoll:
+            db.execute("UPDATE auftraege SET status = 'wartend', gestartet = NULL WHERE id = ?", (zeile['id'],))
+            time.sleep(1)
+            continue
+        except Exception as e:
+            app.logger.exception("Fehler bei Auftrag %s", zeile['id'])
+            fehler = "Zeitüberschreitung beim Erstellen des PDFs" if isinstance(e, concurrent.futures.TimeoutError) \
+                else "Fehler beim Erstellen des PDFs"
+            db.execute("UPDATE auftraege SET status = 'fehler', fehler = ?, fertig = ?, daten = '' WHERE id = ?",
+                       (fehler, time.time(), zeile['id']))
+
+def job_worker_starten():
+    with _job_worker_lock:
+        if _job_worker:
+            return
+        for nr in range(JOB_WORKER):
+            worker = threading.Thread(target=_job_worker_schleife, name=f"auftrag-{nr}", daemon=True)
+            worker.start()
+            _job_worker.append(worker)
+
+def job_status(zeile):
+    status = {
+        'id': zeile['id'],
+        'status': zeile['status'],
+        'erstellt': datetime.fromtimestamp(zeile['erstellt']).isoformat(timespec='seconds'),
+    }
+    if zeile['fertig']:
+        status['fertig'] = datetime.fromtimestamp(zeile['fertig']).isoformat(timespec='seconds')
+        status['gueltig_bis'] = datetime.fromtimestamp(zeile['fertig'] + JOB_TTL).isoformat(timespec='seconds')
+    if zeile['status'] == 'fertig':
+        status['pdf'] = url_for('job_pdf', job_id=zeile['id'])
+    if zeile['fehler']:
+        status['error'] = zeile['fehler']
+    return status
+
+def _job_laden(job_id, felder):
+    zeile = job_db().execute(f"SELECT {felder} FROM auftraege WHERE id = ?", (job_id,)).fetchone()
+    if zeile is None:
+        return None
+    if zeile['fertig'] and zeile['fertig'] < time.time() - JOB_TTL:
+        return None
+    return zeile
+
+@app.route('/jobs', methods=['POST'])
+@zugang_begrenzen(rendern=False)
+def job_neu():
+    job_worker_starten()
+    heute = date.today().strftime("%Y%m%d")
+    try:
+        if 'empfaenger' in request.form or 'empfaenger' in request.files:
+            daten_liste = serienbrief_aus_request()
+            pruefe_umfang(daten_liste, max_seiten=None)
+            if request.form.get('format') == 'zip':
+                job_id = job_anlegen('serienbrief_zip', daten_liste, f'briefe_{heute}.zip', 'application/zip')
+            else:
+                job_id = job_anlegen('serienbrief', daten_liste, f'briefe_{heute}.pdf', 'application/pdf')
+        else:
+            daten = baue_daten(request.form)
+            if not daten['betreff'] or not daten['brieftext']:
+                raise ValueError("Betreff und Brieftext sind Pflichtfelder")
+            pruefe_umfang([daten], max_seiten=None)
+            job_id = job_anlegen('brief', daten, f'brief_{heute}_{daten["absender"]["auswahl"]}.pdf', 'application/pdf')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except ZuUmfangreich as e:
+        return jsonify({"error": str(e)}), 413
+    except RenderPoolVoll:
+        return jsonify({"error": "Zu viele wartende Aufträge, bitte später erneut versuchen"}), 503, {'Retry-After': '30'}
+
+    antwort = jsonify({'id': job_id, 'status': 'wartend', 'url': url_for('job_abfragen', job_id=job_id)})
+    antwort.status_code = 202
+    antwort.headers['Location'] = url_for('job_abfragen', job_id=job_id)
+    return antwort
+
+@app.route('/jobs/<job_id>')
+def job_abfragen(job_id):
+    job_worker_starten()
+    zeile = _job_laden(job_id, "id, status, erstellt, fertig, fehler")
+    if zeile is None:
+        return jsonify({"error": "Auftrag nicht gefunden oder abgelaufen"}), 404
+    return jsonify(job_status(zeile))
+
+@app.route('/jobs/<job_id>/pdf')
+def job_pdf(job_id):
+    zeile = _job_laden(job_id, "status, fertig, dateiname, mimetype, ergebnis")
+    if zeile is None:
+        return jsonify({"error": "Auftrag nicht gefunden oder abgelaufen"}), 404
+    if zeile['status'] != 'fertig':
+        return jsonify({"error": "Auftrag ist noch nicht fertig", "status": zeile['status']}), 409
+    return send_file(
+        io.BytesIO(zeile['ergebnis']),
+        mimetype=zeile['mimetype'],
+        as_attachment=True,
+        download_name=zeile['dateiname']
+    )
+
+# Archiv: jedes PDF aus /generate und /jobs (Einzelbrief) mit Empfänger,
+# Betreff, Datum und Absender in SQLite, mit Volltextsuche über Betreff und
+# Brieftext. Gleiche PDFs (gleicher SHA-256) werden nur einmal gespeichert.
+# Die PDF-Bytes liegen in einer eigenen Tabelle, damit Liste und Suche sie
+# nicht lesen müssen; heruntergeladen wird ohne erneutes Rendern.
+_archiv_lokal = threading.local()
+
+def archiv_db():
+    verbindung = getattr(_archiv_lokal, 'verbindung', None)
+    if verbindung is None:
+        verbindung = sqlite3.connect(str(BASE_DIR / ARCHIV_DATENBANK), timeout=30, isolation_level=None)
+        verbindung.row_factory = sqlite3.Row
+        verbindung.execute("PRAGMA journal_mode=WAL")
+        verbindung.executescript("""
+            CREATE TABLE IF NOT EXISTS pdfs (
+                hash TEXT PRIMARY KEY,
+                pdf BLOB NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS briefe (
+                id INTEGER PRIMARY KEY,
+                hash TEXT NOT NULL UNIQUE REFERENCES pdfs (hash),
+                erstellt REAL NOT NULL,
+                datum TEXT NOT NULL,
+                empfaenger TEXT,
+                anschrift TEXT,
+                betreff TEXT,
+                brieftext TEXT,
+                absender TEXT,
+                mandant TEXT,
+                dateiname TEXT,
+                bytes INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS briefe_datum ON briefe (datum, erstellt);
+            CREATE VIRTUAL TABLE IF NOT EXISTS briefe_suche USING fts5 (
+                betreff, brieftext, content='briefe', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            );
+            CREATE TRIGGER IF NOT EXISTS briefe_suche_neu AFTER INSERT ON briefe BEGIN
+                INSERT INTO briefe_suche (rowid, betreff, brieftext) VALUES (new.id, new.betreff, new.brieftext);
+            END;
+            CREATE TRIGGER IF NOT EXISTS briefe_suche_weg AFTER DELETE ON briefe BEGIN
+                INSERT INTO briefe_suche (briefe_suche, rowid, betreff, brieftext)
+                VALUES ('delete', old.id, old.betreff, old.brieftext);
+            END;
+        """)
+        _archiv_lokal.verbindung = verbindung
+    return verbindung
+
+def archivieren(daten, pdf, dateiname):
+    # Fehler beim Archivieren halten die Auslieferung des Briefs nicht auf
+    if not ARCHIV_DATENBANK:
+        return
+    try:
+        pruefsumme = hashlib.sha256(pdf).hexdigest()
+        db = archiv_db()
+        if db.execute("SELECT 1 FROM briefe WHERE hash = ?", (pruefsumme,)).fetchone():
+            beobachte('archiv_total', 1, ergebnis='vorhanden')
+            return
+        empfaenger = daten['empfaenger']
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.execute("INSERT OR IGNORE INTO pdfs (hash, pdf) VALUES (?, ?)", (pruefsumme, pdf))
+            db.execute(
+                "INSERT OR IGNORE INTO briefe (hash, erstellt, datum, empfaenger, anschrift, betreff, brieftext, "
+                "absender, mandant, dateiname, bytes) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (pruefsumme, time.time(), date.today().isoformat(), empfaenger.get('name'),
+                 ", ".join(filter(None, (empfaenger.get('strasse'), empfaenger.get('plz_ort')))),
+                 daten.get('betreff'), daten.get('brieftext'), daten['absender']['name'],
+                 daten.get('mandant'), dateiname, len(pdf)))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        beobachte('archiv_total', 1, ergebnis='gespeichert')
+    except Exception:
+        beobachte('archiv_total', 1, ergebnis='fehler')
+        app.logger.exception("Fehler beim Archivieren")
+
+def suchanfrage(text):
+    # Jedes Wort als Präfix, alle müssen vorkommen; Anführungszeichen und
+    # FTS-Operatoren im Suchtext haben so keine Sonderbedeutung.
+    return " ".join('"%s"*' % wort.replace('"', '""') for wort in text.split())
+
+def _archiv_eintrag(zeile):
+    eintrag = {schluessel: zeile[schluessel] for schluessel in
+               ('id', 'datum', 'empfaenger', 'anschrift', 'betreff', 'absender', 'mandant', 'dateiname', 'bytes')}
+    eintrag['erstellt'] = datetime.fromtimestamp(zeile['erstellt']).isoformat(timespec='seconds')
+    eintrag['url'] = url_for('archiv_pdf', nr=zeile['id'])
+    if 'auszug' in zeile.keys():
+        eintrag['auszug'] = zeile['auszug']
+    return eintrag
+
+@app.route('/archive')
+@zugang_begrenzen(rendern=False)
+def archiv_suche():
+    # ?q= Volltext über Betreff und Brieftext, ?von=/?bis= Datum (JJJJ-MM-TT),
+    # sonst die neuesten zuerst; seitenweise mit limit und offset
+    if not ARCHIV_DATENBANK:
+        abort(404)
+    suche = request.args.get('q', '').strip()
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    bedingungen = ["b.datum >= ?", "b.datum <= ?"]
+    werte = [request.args.get('von') or '0000-00-00', request.args.get('bis') or '9999-99-99']
+    spalten = "b.id, b.datum, b.erstellt, b.empfaenger, b.anschrift, b.betreff, b.absender, b.mandant, b.dateiname, b.bytes"
+    if suche:
+        sql = (f"SELECT {spalten}, snippet(briefe_suche, 1, '[', ']', ' … ', 12) AS auszug "
+               f"FROM briefe_suche JOIN briefe b ON b.id = briefe_suche.rowid "
+               f"WHERE briefe_suche MATCH ? AND {' AND '.join(bedingungen)} ORDER BY rank LIMIT ? OFFSET ?")
+        werte.insert(0, suchanfrage(suche))
+    else:
+        sql = (f"SELECT {spalten} FROM briefe b WHERE {' AND '.join(bedingungen)} "
+               f"ORDER BY b.erstellt DESC LIMIT ? OFFSET ?")
+    zeilen = archiv_db().execute(sql, (*werte, limit, offset)).fetchall()
+    return jsonify({'briefe': [_archiv_eintrag(zeile) for zeile in zeilen], 'limit': limit, 'offset': offset})
+
+@app.route('/archive/<int:nr>/pdf')
+@zugang_begrenzen(rendern=False)
+def archiv_pdf(nr):
+    if not ARCHIV_DATENBANK:
+        abort(404)
+    zeile = archiv_db().execute(
+        "SELECT b.hash, b.dateiname, p.pdf FROM briefe b JOIN pdfs p ON p.hash = b.hash WHERE b.id = ?",
+        (nr,)).fetchone()
+    if zeile is None:
+        abort(404)
+    antwort = send_file(io.BytesIO(zeile['pdf']), mimetype='application/pdf', as_attachment=True,
+                        download_name=zeile['dateiname'] or f'brief_{nr}.pdf')
+    antwort.set_etag(zeile['hash'])
+    antwort.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return antwort.make_conditional(request)
+
+@app.route('/metrics')
+def metrics():
+    summen = metriken_aller_prozesse() if METRIK_ORDNER else {}
+    zeilen = []
+    for name, metrik in METRIKEN.items():
+        zeilen.extend(metrik.ausgabe(summen.get(name)))
+    return Response("\n".join(zeilen) + "\n", mimetype='text/plain; version=0.0.4')
+
+def batch_cli(argv):
+    parser = argparse.ArgumentParser(
+        prog='app.py batch',
+        description='Serienbrief: einen Brieftext an alle Empfänger einer CSV- oder JSONL-Datei.'
+    )
+    parser.add_argument('empfaenger', help='CSV- oder JSONL-Datei (emp_name, emp_strasse, emp_plz_ort, emp_anrede, anrede)')
+    text = parser.add_mutually_exclusive_group(required=True)
+    text.add_argument('--brief', help='Textdatei mit dem Brieftext')
+    text.add_argument('--muster', help='Briefmuster aus MUSTER_ORDNER; weitere Spalten der Liste füllen die Platzhalter')
+    parser.add_argument('--betreff', default='', help='Pflicht, außer das Briefmuster hat einen Betreff')
+    parser.add_argument('--anrede', default='', help='gemeinsame Anrede, falls die Liste keine enthält')
+    parser.add_argument('--grussformel', default='')
+    parser.add_argument('--logo', choices=['1', '2', '3'], default='1', help='1 = farbig, 2 = schwarz-weiß, 3 = kein Wappen')
+    parser.add_argument('--absender', choices=['s', 'c', 'b'], default='s')
+    parser.add_argument('--blocksatz', action='store_true', help='Brieftext im Blocksatz setzen')
+    parser.add_argument('--profil', choices=sorted(AUSGABE_PROFILE), help='archiv = volle Qualität, email = kleine Datei')
+    parser.add_argument('--mandant', default='', help=f'Briefkopf aus MANDANTEN_ORDNER (Standard: {STANDARD_MANDANT})')
+    parser.add_argument('--zip', action='store_true', help='ZIP mit einzelnen PDFs statt einem Sammel-PDF')
+    parser.add_argument('-o', '--ausgabe', required=True, help='Zieldatei')
+    args = parser.parse_args(argv)
+
+    try:
+        with open(args.empfaenger, encoding='utf-8-sig') as f:
+            empfaenger = lese_empfaenger(f.read(), args.empfaenger)
+        brieftext = ''
+        if args.brief:
+            with open(args.brief, encoding='utf-8') as f:
+                brieftext = f.read()
+    except (OSError, ValueError, csv.Error) as e:
+        parser.error(str(e))
+
+    gemeinsam = {
+        'logo': args.logo,
+        'absender': args.absender,
+        'betreff': args.betreff,
+        'anrede': args.anrede,
+        'brieftext': brieftext,
+        'grußformel': args.grussformel,
+        'ausrichtung': 'blocksatz' if args.blocksatz else '',
+        'profil': args.profil or '',
+        'mandant': args.mandant,
+        'muster': args.muster or '',
+    }
+    try:
+        daten_liste = serienbrief_daten(gemeinsam, empfaenger)
+    except ValueError as e:
+        parser.error(str(e))
+    if daten_liste and not daten_liste[0]['betreff']:
+        parser.error("--betreff fehlt")
+    with open(args.ausgabe, 'wb') as f:
+        if args.zip:
+            pdfs = rendere_alle(erstelle_brief_pdf, [(daten,) for daten in daten_liste])
+            for _ in schreibe_serienbrief_zip(daten_liste, pdfs, f):
+                pass
+        else:
+            shutil.copyfileobj(erstelle_serienbrief_pdf(daten_liste), f)
+    print(f"{len(daten_liste)} Briefe geschrieben: {args.ausgabe}")
+    return 0
+
 if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'batch':
+        sys.exit(batch_cli(sys.argv[2:]))
+
     print("\n" + "="*60)
     print("✨ Brief-Generator - Familie" + " " + config.FAMILIENNAME)
     print("="*60)
@@ -882,4 +3305,7 @@ if __name__ == '__main__':
     print("   http://localhost:8888")
     print("\n⏹️  Zum Beenden: Strg+C drücken\n")
     
+    STATIC_DIR.mkdir(exist_ok=True)
+    if VORWAERMEN:
+        vorwaermen()
     app.run(host='0.0.0.0', port=8888)
\ No newline at end of file
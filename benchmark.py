@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Benchmark für die PDF-Erstellung des Brief-Generators
+
+Erzeugt synthetische Briefe (kurz, viele Aufzählungen, 50 Seiten; mit und
+ohne Wappen; alle Absender-Varianten) und misst erstelle_brief_pdf.
+Jedes Szenario läuft in einem eigenen Prozess, damit die Speicherspitze
+(RSS MB) nur zu diesem Szenario gehört.
+
+Starten:
+python benchmark.py -o ergebnis.json
+
+Vergleich mit einem früheren Lauf (z.B. vor einem reportlab-/Pillow-Update):
+python benchmark.py --vergleich vorher.json
+
+Nur die Startzeit prüfen (import app in einem frischen Prozess):
+python benchmark.py --importzeit 250
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import app
+
+FUELLTEXT = (
+    "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor "
+    "incididunt ut labore et dolore magna aliqua. Ut enim ad minim veniam, quis nostrud "
+    "exercitation ullamco laboris nisi ut aliquip ex ea commodo consequat."
+)
+
+BRIEFTEXTE = {
+    'kurz': "vielen Dank für Ihr Schreiben.\n\n" + FUELLTEXT,
+    'aufzaehlung': "\n".join(f"- Punkt {i}: " + FUELLTEXT[:60 + (i * 37) % 140] for i in range(80)),
+    '50_seiten': "\n\n".join(FUELLTEXT * 3 for _ in range(208)),
+}
+
+LOGOS = {'mit_logo': '1', 'ohne_logo': '3'}
+
+# Module, die erst beim ersten Brief geladen werden sollen
+SPAETE_MODULE = ('reportlab.pdfgen.canvas', 'reportlab.pdfbase.pdfmetrics', 'PIL.Image')
+
+IMPORT_SKRIPT = (
+    "import sys, time, json\n"
+    "start = time.perf_counter()\n"
+    "import app\n"
+    "dauer = time.perf_counter() - start\n"
+    "print(json.dumps({'ms': dauer * 1000, 'geladen': [m for m in sys.argv[1:] if m in sys.modules]}))\n"
+)
+ABSENDER = ('s', 'c', 'b')
+
+
+def szenarien(auswahl=None, genau=None):
+    for text_name, brieftext in BRIEFTEXTE.items():
+        for logo_name, logo in LOGOS.items():
+            for absender in ABSENDER:
+                name = f"{text_name}/{logo_name}/{absender}"
+                if auswahl and not any(teil in name for teil in auswahl):
+                    continue
+                if genau and name != genau:
+                    continue
+                formular = {
+                    'logo': logo,
+                    'absender': absender,
+                    'emp_anrede': 'Frau',
+                    'emp_name': 'Erika Mustermann',
+                    'emp_strasse': 'Beispielstraße 123',
+                    'emp_plz_ort': '12345 Musterstadt',
+                    'betreff': 'Ihr Schreiben vom 1. Januar – Rückfragen zur Abrechnung',
+                    'brieftext': brieftext,
+                }
+                yield name, app.baue_daten(formular)
+
+
+def perzentil(werte, p):
+    werte = sorted(werte)
+    if not werte:
+        return 0.0
+    k = (len(werte) - 1) * p / 100
+    unten = int(k)
+    oben = min(unten + 1, len(werte) - 1)
+    return werte[unten] + (werte[oben] - werte[unten]) * (k - unten)
+
+
+def peak_rss_mb():
+    # Höchststand des ganzen Prozesses; deshalb läuft jedes Szenario in einem
+    # eigenen Prozess (siehe im_eigenen_prozess).
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux meldet KiB, macOS Bytes
+    return round(rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def seiten_zaehlen(pdf):
+    return len(re.findall(rb'/Type /Page[^s]', pdf))
+
+
+def messen(daten, wiederholungen):
+    app.erstelle_brief_pdf(daten)  # Aufwärmen: Bild-Cache, Schriften
+
+    zeiten = []
+    pdf = b''
+    for _ in range(wiederholungen):
+        start = time.perf_counter()
+        pdf = app.erstelle_brief_pdf(daten).getvalue()
+        zeiten.append(time.perf_counter() - start)
+
+    seiten = seiten_zaehlen(pdf)
+    gesamt = sum(zeiten)
+    return {
+        'wiederholungen': wiederholungen,
+        'p50_ms': round(perzentil(zeiten, 50) * 1000, 3),
+        'p90_ms': round(perzentil(zeiten, 90) * 1000, 3),
+        'p99_ms': round(perzentil(zeiten, 99) * 1000, 3),
+        'max_ms': round(max(zeiten) * 1000, 3),
+        'seiten': seiten,
+        'seiten_pro_s': round(seiten * wiederholungen / gesamt, 1) if gesamt else None,
+        'bytes': len(pdf),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def im_eigenen_prozess(name, wiederholungen):
+    # Frischer Interpreter je Szenario: Speicherspitze und Caches hängen nicht
+    # davon ab, welche Szenarien vorher liefen (-s).
+    verzeichnis = os.path.dirname(os.path.abspath(__file__))
+    ausgabe = subprocess.run([sys.executable, os.path.abspath(__file__), '--einzeln', name,
+                              '-n', str(wiederholungen)],
+                             cwd=verzeichnis, capture_output=True, text=True, check=True)
+    return json.loads(ausgabe.stdout.strip().splitlines()[-1])
+
+
+def importzeit(wiederholungen):
+    # Jeder Lauf in einem neuen Interpreter, sonst misst man nur sys.modules
+    verzeichnis = os.path.dirname(os.path.abspath(__file__))
+    zeiten = []
+    geladen = []
+    for _ in range(wiederholungen):
+        ausgabe = subprocess.run([sys.executable, '-c', IMPORT_SKRIPT, *SPAETE_MODULE],
+                                 cwd=verzeichnis, capture_output=True, text=True, check=True)
+        werte = json.loads(ausgabe.stdout.strip().splitlines()[-1])
+        zeiten.append(werte['ms'])
+        geladen = werte['geladen']
+    return {
+        'p50_ms': round(perzentil(zeiten, 50), 1),
+        'max_ms': round(max(zeiten), 1),
+        'zu_frueh_geladen': geladen,
+    }
+
+
+def umgebung():
+    import reportlab
+    import PIL
+    return {
+        'zeitpunkt': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'plattform': platform.platform(),
+        'reportlab': reportlab.Version,
+        'pillow': PIL.__version__,
+    }
+
+
+def vergleichen(alt, neu, schwelle):
+    regressionen = []
+    print(f"\n{'Szenario':<32} {'p50 alt':>10} {'p50 neu':>10} {'Δ':>8} {'Bytes Δ':>9}")
+    for name, werte in neu['szenarien'].items():
+        vorher = alt.get('szenarien', {}).get(name)
+        if not vorher:
+            continue
+        delta = (werte['p50_ms'] - vorher['p50_ms']) / vorher['p50_ms'] * 100 if vorher['p50_ms'] else 0.0
+        bytes_delta = werte['bytes'] - vorher['bytes']
+        markierung = "  ⚠" if delta > schwelle else ""
+        print(f"{name:<32} {vorher['p50_ms']:>10.2f} {werte['p50_ms']:>10.2f} {delta:>+7.1f}% {bytes_delta:>+9}{markierung}")
+        if delta > schwelle:
+            regressionen.append(name)
+    return regressionen
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark für erstelle_brief_pdf')
+    parser.add_argument('-n', '--wiederholungen', type=int, default=20,
+                        help='Messungen pro Szenario (Standard: 20)')
+    parser.add_argument('-s', '--szenario', action='append',
+                        help='nur Szenarien, deren Name den Text enthält (mehrfach möglich)')
+    parser.add_argument('-o', '--ausgabe', help='Ergebnisse als JSON speichern')
+    parser.add_argument('--vergleich', help='früheres JSON-Ergebnis zum Vergleich')
+    parser.add_argument('--schwelle', type=float, default=10.0,
+                        help='p50-Verschlechterung in Prozent, ab der ein Vergleich fehlschlägt (Standard: 10)')
+    parser.add_argument('--importzeit', type=float, metavar='MS',
+                        help='nur "import app" messen und fehlschlagen, wenn der Median über MS liegt '
+                             'oder reportlab/PIL schon beim Import geladen werden')
+    parser.add_argument('--einzeln', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.einzeln:
+        for _, daten in szenarien(genau=args.einzeln):
+            print(json.dumps(messen(daten, args.wiederholungen)))
+            return 0
+        parser.error(f"unbekanntes Szenario: {args.einzeln}")
+
+    if args.importzeit is not None:
+        werte = importzeit(max(args.wiederholungen, 5))
+        print(f"import app: p50 {werte['p50_ms']:.1f} ms, max {werte['max_ms']:.1f} ms (Budget {args.importzeit:g} ms)")
+        if werte['zu_frueh_geladen']:
+            print("Beim Import geladen: " + ", ".join(werte['zu_frueh_geladen']))
+            return 1
+        return 0 if werte['p50_ms'] <= args.importzeit else 1
+
+    ergebnis = {'umgebung': umgebung(), 'szenarien': {}}
+    print(f"{'Szenario':<32} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'Seiten/s':>9} {'Bytes':>9} {'RSS MB':>7}")
+    for name, _ in szenarien(args.szenario):
+        werte = im_eigenen_prozess(name, args.wiederholungen)
+        ergebnis['szenarien'][name] = werte
+        print(f"{name:<32} {werte['p50_ms']:>9.2f} {werte['p90_ms']:>9.2f} {werte['p99_ms']:>9.2f} "
+              f"{werte['seiten_pro_s'] or 0:>9.1f} {werte['bytes']:>9} {werte['peak_rss_mb'] or 0:>7.1f}")
+
+    if args.ausgabe:
+        with open(args.ausgabe, 'w', encoding='utf-8') as f:
+            json.dump(ergebnis, f, indent=2, ensure_ascii=False)
+        print(f"\nErgebnisse gespeichert: {args.ausgabe}")
+
+    if args.vergleich:
+        with open(args.vergleich, encoding='utf-8') as f:
+            alt = json.load(f)
+        regressionen = vergleichen(alt, ergebnis, args.schwelle)
+        if regressionen:
+            print(f"\n{len(regressionen)} Szenario(s) mehr als {args.schwelle:g}% langsamer.")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -18,3 +18,90 @@ DATEI_PROXY = "proxy.png"
 DATEI_PROXY_SW = "proxysw.png"
 DATEI_UNTERSCHRIFT_1 = "Unterschrift_Ehepartner_1.png"
 DATEI_UNTERSCHRIFT_2 = "Unterschrift_Ehepartner_2.png"
+
+# Render-Pool (optional): PDFs in eigenen Prozessen erstellen, damit parallele
+# Anfragen und Serienbriefe alle CPU-Kerne nutzen. 0 = im Request rendern.
+# Die Worker starten als frische Prozesse (forkserver bzw. spawn). Eigene Skripte,
+# die app importieren und rendern, brauchen dafür  if __name__ == '__main__':
+RENDER_POOL_WORKER = 0
+RENDER_POOL_WARTESCHLANGE = 32   # Anfragen, die auf einen freien Worker warten dürfen
+RENDER_POOL_TIMEOUT = 60         # Sekunden pro Auftrag
+# Briefe ab so vielen Seiten seitenweise auf alle Worker verteilen (braucht
+# RENDER_POOL_WORKER > 0). 0 = jeder Brief in einem Worker.
+SEITEN_PARALLEL_AB = 0
+
+# Serienbriefe und Ergebnisse aus dem Render-Pool ab dieser Größe (Bytes) in eine
+# temporäre Datei statt in den Speicher schreiben
+STREAM_SPEICHER_GRENZE = 8 * 1024 * 1024
+
+# Ergebnis-Cache: identische Anfragen an /generate ohne erneutes Rendern beantworten
+ERGEBNIS_CACHE_BYTES = 64 * 1024 * 1024   # Obergrenze im Speicher
+ERGEBNIS_CACHE_ORDNER = None              # z.B. "cache" für einen zusätzlichen Cache auf der Platte
+
+# Auftrags-Warteschlange (/jobs) für lange Briefe und Serienbriefe
+JOB_DATENBANK = "auftraege.sqlite3"   # SQLite-Datei, überlebt Neustarts
+JOB_WORKER = 2                        # Threads pro Prozess, die Aufträge abarbeiten
+JOB_WARTESCHLANGE = 100               # maximal wartende Aufträge
+JOB_TTL = 3600                        # Sekunden, die fertige PDFs abrufbar bleiben
+JOB_LAUFZEIT_MAX = 600                # Sekunden; länger laufende Aufträge gelten als abgestürzt und starten neu
+
+# Archiv: jedes erstellte PDF mit Empfänger, Betreff und Datum speichern und
+# über /archive durchsuchbar machen. None = aus. Nur hinter einer Anmeldung
+# (Reverse-Proxy) einschalten: das Archiv enthält alle Briefe im Klartext.
+# Relative Pfade liegen im Programmordner (*.sqlite3 steht in .gitignore);
+# besser ist ein absoluter Pfad außerhalb, z.B. "/var/lib/brief-generator/archiv.sqlite3".
+ARCHIV_DATENBANK = None
+
+# Ordner, in dem jeder Prozess seine Messwerte für /metrics ablegt. Nötig, sobald
+# mehrere Prozesse laufen (gunicorn mit mehreren Workern): /metrics zählt dann
+# alle zusammen. None = nur der Prozess, der die Anfrage bearbeitet.
+METRIK_ORDNER = None   # z.B. "/var/lib/brief-generator/metriken"
+
+# Beim Serverstart Bilder, Briefkopf-Vorlagen und Wortbreiten vorbereiten.
+# Für kurzlebige Aufrufe (CLI, Serverless) ohne Wirkung: dort wird alles beim ersten Brief geladen.
+VORWAERMEN = True
+
+# Schriften: TrueType-Dateien statt Helvetica, z.B. für polnische oder türkische
+# Buchstaben und typografische Anführungszeichen. None = Helvetica (nur WinAnsi).
+# Ohne TTF_SCHRIFT_FETT wird auch fett in TTF_SCHRIFT gesetzt.
+TTF_SCHRIFT = None        # z.B. "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+TTF_SCHRIFT_FETT = None   # z.B. "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"
+
+# Brieftext standardmäßig im Blocksatz setzen (im Formular umschaltbar)
+BLOCKSATZ = False
+
+# PDF-Ausgabe: "archiv" bettet Wappen und Unterschriften in Originalauflösung ein,
+# "email" rechnet sie auf EMAIL_BILD_DPI bei gedruckter Größe herunter (kleine Dateien)
+AUSGABE_PROFIL = "archiv"
+EMAIL_BILD_DPI = 200
+EMAIL_SEITEN_KOMPRESSION = True   # Seiteninhalt mit zlib komprimieren
+
+# Zugangskontrolle für /generate, /generate/batch und /jobs
+ANFRAGE_MAX_BYTES = 2 * 1024 * 1024   # größere Anfragen: 413
+BRIEFTEXT_MAX_ZEICHEN = 500_000       # pro Brief: 413
+ANFRAGE_MAX_SEITEN = 100              # geschätzte Seiten aller Briefe einer Anfrage (nicht /jobs): 413
+RATE_LIMIT_PRO_MINUTE = 60            # Anfragen pro Client-IP und Minute, 0 = aus: 429
+RATE_LIMIT_BURST = 20                 # so viele Anfragen am Stück sind erlaubt
+VORSCHAU_PRO_MINUTE = 600             # /preview (beim Tippen) hat ein eigenes Limit, 0 = aus
+RENDER_GLEICHZEITIG = 4               # gleichzeitig rendernde Anfragen pro Prozess, 0 = unbegrenzt
+RENDER_PLATZ_WARTEZEIT = 2            # Sekunden Wartezeit auf einen freien Platz, danach 429
+VERTRAUTE_PROXYS = 0                  # Anzahl Reverse-Proxys vor der App (X-Forwarded-For auswerten)
+
+# Mandanten: weitere Briefköpfe in einem Server. Jede Datei <name>.py in diesem
+# Ordner (Format wie config.py, fehlende Werte kommen von hier) ist ein Mandant,
+# auswählbar mit ?mandant=<name> bzw. dem Formularfeld "mandant". Bilder liegen
+# in <ordner>/<ORDNER_STATIC>, Standard <ordner>/<name>/. None = nur diese Datei.
+MANDANTEN_ORDNER = None
+MANDANTEN_CACHE = 256            # geladene Mandanten im Speicher
+
+# Briefmuster: Ordner mit <name>.txt-Dateien, deren Text {{platzhalter}}
+# enthält (erste Zeile optional "Betreff: ..."). Auswahl über das Feld
+# "muster" bzw. --muster. None = keine Briefmuster.
+MUSTER_ORDNER = None
+
+# Obergrenzen der Caches für Bilder und Briefkopf-/Unterschrifts-Vorlagen (Einträge).
+# Bei vielen Mandanten bleiben nur die zuletzt benutzten im Speicher.
+BILD_CACHE_EINTRAEGE = 128
+VORLAGEN_CACHE_EINTRAEGE = 512
+ABSATZ_CACHE_EINTRAEGE = 4096    # umbrochene Absätze (Vorschau, Serienbriefe)
+ABSATZ_CACHE_ZEICHEN = 2_000_000 # ... und ihre Gesamtlänge in Zeichen (Absatz plus Zeilen)
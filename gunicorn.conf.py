@@ -0,0 +1,45 @@
+"""
+gunicorn-Konfiguration für den Brief-Generator
+
+Starten:
+gunicorn -c gunicorn.conf.py wsgi:app
+
+Einzelne Werte lassen sich auf der Kommandozeile überschreiben, z.B.
+gunicorn -c gunicorn.conf.py -w 2 -b 127.0.0.1:8000 wsgi:app
+"""
+
+import gc
+import multiprocessing
+
+bind = "0.0.0.0:8888"
+
+# App einmal im Master laden (wsgi.py wärmt dort alle Caches vor); die Worker
+# erben den Speicher per fork und teilen ihn, solange er nicht verändert wird.
+preload_app = True
+
+# Rendern ist CPU-Arbeit unter dem GIL: ein Prozess pro Kern. Die Threads
+# halten nur Downloads, Job-Abfragen und /metrics nicht hinter einem Brief auf.
+# Bei mehr als einem Worker METRIK_ORDNER setzen, sonst zeigt /metrics nur einen.
+workers = multiprocessing.cpu_count()
+worker_class = "gthread"
+threads = 4
+
+# Ein Brief braucht Millisekunden, 50 Seiten unter 0,1 s. Lange Serienbriefe
+# gehören in /jobs. Die Grenze liegt über RENDER_POOL_TIMEOUT (60 s), damit der
+# Render-Pool zuerst mit 504 antwortet, statt dass gunicorn den Worker abschießt.
+timeout = 90
+graceful_timeout = 30
+keepalive = 5
+
+# Worker regelmäßig erneuern, damit Caches und Fragmentierung nicht endlos wachsen
+max_requests = 1000
+max_requests_jitter = 100
+
+accesslog = "-"
+
+
+def when_ready(server):
+    # Alles, was beim Preload entstanden ist, aus der Garbage Collection
+    # nehmen: sonst schreibt der GC in den Workern in jedes Objekt und die
+    # geteilten Speicherseiten werden kopiert.
+    gc.freeze()
@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+"""
+WSGI-Einstiegspunkt für den Produktivbetrieb
+
+Starten:
+gunicorn -c gunicorn.conf.py wsgi:app
+
+Mit preload_app (siehe gunicorn.conf.py) läuft dieses Modul einmal im
+Master-Prozess. Schriften, dekodierte Bilder, Briefkopf-Vorlagen und das
+Startseiten-Template liegen danach schon im Speicher und werden von den
+Workern nach dem fork copy-on-write geteilt.
+"""
+
+import app as brief_generator
+
+app = brief_generator.app
+
+brief_generator.STATIC_DIR.mkdir(exist_ok=True)
+if brief_generator.VORWAERMEN:
+    brief_generator.vorwaermen()
+    brief_generator.index_template()